@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Compares the streaming dbprep engine against the original pandas path on a
+# synthetic scrape. Each run happens in a fresh interpreter so peak RSS and
+# import time are measured per engine.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Text the real scrape contains besides ASCII: IPA, accents, typographic
+# punctuation, emoji, and control characters (DEL encodes differently in
+# pandas and json.dumps)
+EXTRA_TEXT = ['', '', '', ' café', ' naïve', ' — “quoted”', ' \u2028line', ' 😀', ' tab\there', ' del\x7f',
+              ' nul\x00', ' esc\x1b', ' back\\slash', ' nbsp\xa0']
+
+
+def synthetic_word_info(word, rng):
+    meanings = []
+    for part_of_speech in rng.sample(['noun', 'verb', 'adjective', 'adverb'], rng.randint(1, 3)):
+        meanings.append({
+            'partOfSpeech': part_of_speech,
+            'definitions': [{
+                'definition': f'Definition {i} of {word} as a {part_of_speech}.{rng.choice(EXTRA_TEXT)}',
+                **({'example': f'Example {i} using {word}.{rng.choice(EXTRA_TEXT)}'} if rng.random() < 0.6 else {}),
+                'synonyms': [],
+                'antonyms': [],
+            } for i in range(rng.randint(1, 6))],
+            'synonyms': [f'syn{rng.randint(0, 50)}' for _ in range(rng.randint(0, 8))],
+            'antonyms': [f'ant{rng.randint(0, 50)}' for _ in range(rng.randint(0, 4))],
+        })
+    return [{
+        'word': word,
+        'phonetics': [{'text': f'/ˈ{word}ɪŋ/', 'audio': f'https://api.dictionaryapi.dev/media/pronunciations/en/{word}-us.mp3'}],
+        'meanings': meanings,
+    }]
+
+
+def write_synthetic_scrape(file_path, count, seed=0):
+    rng = random.Random(seed)
+    with open(file_path, 'w') as f:
+        for i in range(count):
+            word = f'word{i}'
+            f.write(json.dumps({'Word': word, 'WordInfo': synthetic_word_info(word, rng)}) + '\n')
+
+
+def run_engine(engine, input_file, output_file, workers):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', engine, input_file, output_file, str(workers)],
+        capture_output=True, text=True, check=True)
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats['wall_seconds'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def child(engine, input_file, output_file, workers):
+    sys.path.insert(0, SCRIPT_DIR)
+    start = time.perf_counter()
+    import dbprep
+    if engine == 'pandas':
+        dbprep.run_pandas(input_file, output_file)
+    else:
+        dbprep.write_records(output_file, dbprep.extract_records(input_file, workers))
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(json.dumps({
+        'engine': engine,
+        'workers': workers,
+        'seconds': round(time.perf_counter() - start, 3),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(max(usage.ru_maxrss, children.ru_maxrss) / 1024, 1),
+    }))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        engine, input_file, output_file, workers = sys.argv[2:6]
+        child(engine, input_file, output_file, int(workers))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark dbprep engines on a synthetic scrape.')
+    parser.add_argument('--words', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skip-pandas', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, 'scrape.jsonl')
+        write_synthetic_scrape(input_file, args.words)
+        print(f"Synthetic scrape: {args.words} words, {os.path.getsize(input_file) / 1e6:.1f} MB")
+
+        runs = [('stream', 1)]
+        if args.workers > 1:
+            runs.append(('stream', args.workers))
+        if not args.skip_pandas:
+            runs.append(('pandas', 1))
+
+        outputs = {}
+        for engine, workers in runs:
+            output_file = os.path.join(tmp, f'{engine}-{workers}.json')
+            stats = run_engine(engine, input_file, output_file, workers)
+            with open(output_file, 'rb') as f:
+                outputs[(engine, workers)] = f.read()
+            print(json.dumps(stats))
+
+        reference = outputs[runs[0]]
+        for run, output in outputs.items():
+            if output != reference:
+                print(f"Output of {run} differs from {runs[0]}")
+                sys.exit(1)
+        print("All engines produced identical output")
+
+
+if __name__ == '__main__':
+    main()
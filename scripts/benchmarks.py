@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+from bench_dbprep import synthetic_word_info
+
+# Benchmarks every pipeline stage on synthetic corpora against local stand-ins
+# (stub_servers for Ollama and the dictionary API, MemorySink for Firestore).
+# Each (stage, size) runs in a fresh interpreter so peak RSS is per stage.
+# Results are JSON and can be compared against benchmark_baseline.json.
+# The baseline holds absolute timings, so it only means something on the
+# machine that recorded it: it isn't checked in, and each machine records
+# its own with --save-baseline (again after changing any settings). A
+# baseline from another host or with other settings is not compared.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SIZES = [1000, 10000, 100000]
+SYLLABLES = ['ba', 'co', 'di', 'fe', 'gu', 'ha', 'ki', 'lo', 'mu', 'ne',
+             'pa', 'ri', 'so', 'tu', 've', 'wo', 'xi', 'ya', 'ze', 'qu']
+FILLER = ['the', 'a', 'quiet', 'river', 'always', 'seemed', 'to', 'carry', 'old', 'stories',
+          'of', 'people', 'who', 'never', 'left', 'town', 'and', 'rarely', 'spoke', 'about', 'it']
+
+
+def synthetic_word(i):
+    # Unique, alphabetic, word-like: i written in base len(SYLLABLES)
+    parts = []
+    while True:
+        i, digit = divmod(i, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+        if not i:
+            break
+    return ''.join(reversed(parts)) + 'n'
+
+
+def synthetic_sentence(word, rng):
+    words = rng.sample(FILLER, rng.randint(6, 14))
+    words.insert(rng.randrange(len(words) + 1), word)
+    return ' '.join(words).capitalize() + '.'
+
+
+def synthetic_corpus(count, seed=0):
+    # Entries in the processed_words.json schema
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        word = synthetic_word(i)
+        corpus.append({
+            'word': word,
+            'definition': f'To {synthetic_sentence(word, rng).lower()}',
+            'wordType': rng.choice(['noun', 'verb', 'adjective', 'adverb']),
+            'examples': [synthetic_sentence(word, rng) for _ in range(3)],
+            'synonyms': [synthetic_word(rng.randrange(count)) for _ in range(rng.randint(0, 5))],
+            'antonyms': [synthetic_word(rng.randrange(count)) for _ in range(rng.randint(0, 3))],
+        })
+    return corpus
+
+
+def timed(func, latencies):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+class TimedSink:
+    def __init__(self, sink):
+        self.sink = sink
+        self.latencies = []
+        self.commit = timed(sink.commit, self.latencies)
+
+
+# Each stage takes (size, settings, tmp) and returns (items, seconds, latencies,
+# extra). Only the measured section counts towards `seconds`, not building the
+# corpus; latencies are in seconds per the stage's `unit`.
+
+def stage_extract_info(size, settings, tmp):
+    import dbprep
+    rng = random.Random(0)
+    infos = [synthetic_word_info(synthetic_word(i), rng) for i in range(size)]
+    latencies = []
+    extract = timed(dbprep.extract_info, latencies)
+    start = time.perf_counter()
+    for info in infos:
+        extract(info)
+    return size, time.perf_counter() - start, latencies, {}
+
+
+def stage_swear_scan(size, settings, tmp):
+    from comb_contents import load_json, process_word_data
+    from swear_matcher import SwearMatcher
+    corpus = synthetic_corpus(size)
+    matcher = SwearMatcher(load_json(os.path.join(SCRIPT_DIR, 'swears.json')))
+    latencies = []
+    scan = timed(process_word_data, latencies)
+    start = time.perf_counter()
+    flagged = sum(1 for entry in corpus if scan(entry, matcher)[0])
+    return size, time.perf_counter() - start, latencies, {'flagged': flagged}
+
+
+def stage_scrape(size, settings, tmp):
+    from stub_servers import start_dictionary_server
+    spec = importlib.util.spec_from_file_location('data_scrape', os.path.join(SCRIPT_DIR, 'data-scrape.py'))
+    scraper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(scraper)
+
+    words = [synthetic_word(i) for i in range(min(size, settings['network_items']))]
+    server = start_dictionary_server(latency=settings['http_latency'])
+    base_url = f'http://127.0.0.1:{server.server_port}/api/v2/entries/en'
+    latencies = []
+    fetch = scraper.fetch_cached
+
+    async def timed_fetch(*args):
+        start = time.perf_counter()
+        try:
+            return await fetch(*args)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    scraper.fetch_cached = timed_fetch
+    ok = 0
+
+    def on_result(i, word, status, body):
+        nonlocal ok
+        ok += status == 200
+
+    # The rate is set high enough that only the stub's latency limits throughput
+    start = time.perf_counter()
+    asyncio.run(scraper.scrape(words, 0, on_result, settings['concurrency'], 1e6, base_url))
+    seconds = time.perf_counter() - start
+    server.shutdown()
+    return len(words), seconds, latencies, {'ok': ok, 'requests': server.requests}
+
+
+def start_llm_stub(settings):
+    from stub_servers import start_ollama_server
+    server = start_ollama_server(latency=settings['llm_latency'], messy_rate=0.1, invalid_rate=0.02,
+                                 fail_rate=0.1)
+    # The ollama package reads OLLAMA_HOST when it is first imported
+    os.environ['OLLAMA_HOST'] = f'http://127.0.0.1:{server.server_port}'
+    return server
+
+
+def stage_generate(size, settings, tmp):
+    server = start_llm_stub(settings)
+    import genDB
+    from journal import Journal
+
+    words = [synthetic_word(i) for i in range(min(size, settings['network_items']))]
+    latencies = []
+    process = timed(partial(genDB.process_word, cache=None), latencies)
+    journal = Journal(os.path.join(tmp, 'processed_words.jsonl'))
+    failed = 0
+
+    def on_result(i, word, result, error, info):
+        nonlocal failed
+        if result:
+            journal.append(result)
+        failed += not result
+        if (i + 1) % 100 == 0:
+            journal.flush()
+
+    start = time.perf_counter()
+    genDB.generate(words, 0, set(), settings['concurrency'], on_result, process)
+    journal.close()
+    seconds = time.perf_counter() - start
+    server.shutdown()
+    return len(words), seconds, latencies, {'model_calls': server.requests, 'failed': failed}
+
+
+def stage_verify(size, settings, tmp):
+    server = start_llm_stub(settings)
+    import improve_quality
+    from journal import Journal
+
+    corpus = synthetic_corpus(min(size, settings['network_items']))
+    latencies = []
+    process_batch = timed(improve_quality.process_batch, latencies)
+    edits = 0
+    start = time.perf_counter()
+    with Journal(os.path.join(tmp, 'verify_edits.jsonl')) as journal:
+        for i in range(0, len(corpus), 10):
+            end = min(i + 10, len(corpus))
+            for edit in process_batch([(index, corpus[index]) for index in range(i, end)]):
+                journal.append(edit)
+                edits += 1
+            journal.append({'checkpoint': end})
+            journal.flush()
+    seconds = time.perf_counter() - start
+    server.shutdown()
+    return len(corpus), seconds, latencies, {'edits': edits}
+
+
+def stage_upload(size, settings, tmp):
+    from firestore_io import BATCH_LIMIT, MemorySink, write_batches
+    from uploadToDb import build_docs, iter_batches
+
+    corpus = synthetic_corpus(size)
+    sink = TimedSink(MemorySink(latency=settings['firestore_latency']))
+    start = time.perf_counter()
+    failed = write_batches(sink, iter_batches(build_docs(corpus), BATCH_LIMIT), max_in_flight=4)
+    return sink.sink.writes, time.perf_counter() - start, sink.latencies, {'failed_batches': len(failed)}
+
+
+def stage_clone(size, settings, tmp):
+    from clone_db import CloneCheckpoint, clone, partition_bounds
+    from firestore_io import MemorySink
+    from uploadToDb import build_docs
+
+    source = MemorySink(latency=settings['firestore_latency'])
+    source.docs.update(build_docs(synthetic_corpus(size)))
+    sink = TimedSink(MemorySink(latency=settings['firestore_latency']))
+    start = time.perf_counter()
+    errors = clone(source, sink, CloneCheckpoint(None, partition_bounds(8)))
+    return sink.sink.writes, time.perf_counter() - start, sink.latencies, {'errors': len(errors)}
+
+
+def stage_review_queues(size, settings, tmp):
+    # `size` is the number of users; a second pass after 1% of the documents
+    # changed measures the incremental run
+    from firestore_io import MemorySink
+    from review_queues import ReviewState, fake_store, load_positions, touch_fake, update_queues
+
+    user_words, words = fake_store(size)
+    positions = load_positions(words.iter_range())
+    user_words.latency = settings['firestore_latency']
+    sink = TimedSink(MemorySink(latency=settings['firestore_latency']))
+    state = ReviewState(os.path.join(tmp, 'review_queues.sqlite'))
+    full = update_queues(user_words, state, positions, sink)
+    touch_fake(user_words, len(user_words.docs) // 100)
+    incremental = update_queues(user_words, state, positions, sink)
+    state.close()
+    return full['written'], full['seconds'], sink.latencies, {
+        'documents': full['scanned'],
+        'scan_seconds': round(full['scan_seconds'], 3),
+        'incremental_documents': incremental['scanned'],
+        'incremental_queues': incremental['written'],
+        'incremental_seconds': round(incremental['seconds'], 3),
+    }
+
+
+# name: (function, unit the latencies are measured per)
+STAGES = {
+    'extract_info': (stage_extract_info, 'word'),
+    'swear_scan': (stage_swear_scan, 'word'),
+    'scrape': (stage_scrape, 'request'),
+    'generate': (stage_generate, 'word'),
+    'verify': (stage_verify, 'batch of 10'),
+    'upload': (stage_upload, 'batch commit'),
+    'clone': (stage_clone, 'batch commit'),
+    'review_queues': (stage_review_queues, 'batch commit'),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    summary = {f'p{int(q * 100)}': percentile(values, q) for q in (0.5, 0.9, 0.99)}
+    summary['max'] = values[-1] if values else None
+    return {key: round(value * 1000, 4) if value is not None else None for key, value in summary.items()}
+
+
+def child(stage, size, settings):
+    sys.path.insert(0, SCRIPT_DIR)
+    function, unit = STAGES[stage]
+    with tempfile.TemporaryDirectory() as tmp:
+        # Stages print progress and edits; only the result line goes to stdout
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            items, seconds, latencies, extra = function(size, settings, tmp)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print(json.dumps({
+        'stage': stage,
+        'size': size,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput': round(items / max(seconds, 1e-9), 1),
+        'latency_unit': unit,
+        'latency_ms': latency_summary(latencies),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        **extra,
+    }))
+
+
+def run_stage(stage, size, settings):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, str(size), json.dumps(settings)],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'stage': stage, 'size': size, 'error': result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    # Returns the regressions: throughput down, or p90 latency or peak RSS up,
+    # by more than `tolerance` relative to the baseline.
+    base = {(row['stage'], row['size']): row for row in baseline['results'] if 'error' not in row}
+    regressions = []
+    print(f"\n{'stage':<14}{'size':>8}{'throughput':>14}{'p90 latency':>14}{'peak RSS':>12}")
+    for row in results:
+        old = base.get((row['stage'], row['size']))
+        if old is None or 'error' in row:
+            continue
+        changes = {
+            'throughput': (row['throughput'] - old['throughput']) / max(old['throughput'], 1e-9),
+            'p90 latency': ((row['latency_ms']['p90'] or 0) - (old['latency_ms']['p90'] or 0))
+            / max(old['latency_ms']['p90'] or 0, 1e-9),
+            'peak RSS': (row['peak_rss_mb'] - old['peak_rss_mb']) / max(old['peak_rss_mb'], 1e-9),
+        }
+        worse = [name for name, change in changes.items()
+                 if (-change if name == 'throughput' else change) > tolerance]
+        print(f"{row['stage']:<14}{row['size']:>8}" + ''.join(
+            f"{change:>+13.0%}{'!' if name in worse else ' '}" for name, change in changes.items()))
+        regressions.extend(f"{row['stage']} @ {row['size']}: {name} {changes[name]:+.0%}" for name in worse)
+    return regressions
+
+
+def host_info():
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]), json.loads(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage against local stand-ins.')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--network-items', type=int, default=2000,
+                        help='Cap on words sent through the HTTP and Ollama stubs per run (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--http-latency', type=float, default=0.005,
+                        help='Simulated dictionary API latency in seconds')
+    parser.add_argument('--llm-latency', type=float, default=0.002,
+                        help='Simulated model latency in seconds')
+    parser.add_argument('--firestore-latency', type=float, default=0.01,
+                        help='Simulated Firestore commit and page latency in seconds')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=os.path.join(SCRIPT_DIR, 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results to the baseline file instead of comparing; needed once per '
+                             'machine and after changing settings')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative change reported as a regression (default: 0.25)')
+    args = parser.parse_args()
+
+    settings = {
+        'network_items': args.network_items,
+        'concurrency': args.concurrency,
+        'http_latency': args.http_latency,
+        'llm_latency': args.llm_latency,
+        'firestore_latency': args.firestore_latency,
+    }
+    results = []
+    for stage in args.stages:
+        for size in args.sizes:
+            row = run_stage(stage, size, settings)
+            results.append(row)
+            if 'error' in row:
+                print(f"{stage} @ {size}: failed: {row['error']}")
+            else:
+                print(f"{stage} @ {size}: {row['items']} items in {row['seconds']}s "
+                      f"({row['throughput']}/s), p50 {row['latency_ms']['p50']}ms "
+                      f"p99 {row['latency_ms']['p99']}ms per {row['latency_unit']}, "
+                      f"peak RSS {row['peak_rss_mb']} MB")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': host_info(),
+        'settings': settings,
+        'results': results,
+    }
+    output = args.baseline if args.save_baseline else args.output
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.save_baseline:
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one on this machine with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('host') != report['host'] or baseline.get('settings') != settings:
+        print(f"Warning: {args.baseline} was recorded on another host or with other settings; not comparing. "
+              f"Rerun with --save-baseline to record one for this machine.")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,104 +1,254 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
+import argparse
+import json
+import os
+import queue
+import random
+import string
+import threading
 import time
 
-# Optimized script to copy from default to another database
-print("Starting optimized database copy...")
-
-# Load service account
-cred = credentials.Certificate("../serviceAccountKey.json")
-print(f"Service account project ID: {cred.project_id}")
-
-# Initialize source app (default database)
-source_app = firebase_admin.initialize_app(cred, name="source")
-source_db = firestore.client(app=source_app)
-print("Connected to source database (default)")
-
-# Initialize target app for sj-eloquent-prod database
-target_app = firebase_admin.initialize_app(cred, name="target")
-
-# Connect to the target database using database_id parameter
-target_db = firestore.client(app=target_app, database_id="sj-eloquent-prod")
-print("Connected to target database (sj-eloquent-prod)")
-
-# Get all data from source
-print("Reading data from source...")
-docs = []
-words_ref = source_db.collection("words")
-read_batch_size = 1000  # For reading
-
-# Get documents in smaller batches to avoid memory issues
-query = words_ref.limit(read_batch_size)
-while True:
-    batch = list(query.stream())
-    if not batch:
-        break
-        
-    docs.extend(batch)
-    print(f"Read {len(docs)} documents so far...")
-    
-    # Get the last document as a starting point for the next batch
-    last = batch[-1]
-    query = words_ref.start_after(last).limit(read_batch_size)
-
-total_docs = len(docs)
-print(f"Total: Read {total_docs} documents from source")
-
-# Try a single test document first
-if docs:
-    try:
-        first_doc = docs[0]
-        test_id = first_doc.id
-        test_data = first_doc.to_dict()
-        
-        print(f"Testing with document ID: {test_id}")
-        target_db.collection("words").document(test_id).set(test_data)
-        print("✅ Successfully wrote test document")
-    except Exception as e:
-        print(f"❌ Error writing test document: {e}")
-        firebase_admin.delete_app(source_app)
-        firebase_admin.delete_app(target_app)
-        exit(1)
-
-# Write to target using batched writes (much faster)
-print("Writing to target database using batched writes...")
-success = 0
-errors = 0
-write_batch_size = 500  # Firestore limits batch to 500 writes
-
-# Process documents in batches
-for i in range(0, total_docs, write_batch_size):
-    # Create a new batch
-    batch = target_db.batch()
-    
-    # Add up to 500 documents to the batch
-    end_idx = min(i + write_batch_size, total_docs)
-    current_batch_docs = docs[i:end_idx]
-    
-    print(f"Preparing batch {i//write_batch_size + 1} ({len(current_batch_docs)} documents)")
-    
-    # Add each document to the batch
-    for doc in current_batch_docs:
-        doc_ref = target_db.collection("words").document(doc.id)
-        batch.set(doc_ref, doc.to_dict())
-    
-    # Commit the batch
+from firestore_io import (BATCH_LIMIT, FirestoreSink, FirestoreSource, MemorySink,
+                          init_firestore)
+
+# Pipelined copy from the default database to another database: one reader per
+# document-ID range feeds a bounded queue drained by concurrent batch writers.
+
+# Characters that can start a document ID, in Firestore's (byte) sort order.
+# Auto-generated IDs use [0-9A-Za-z]; word IDs from uploadToDb use lowercase,
+# digits and a few escapes.
+ID_ALPHABET = "%'-" + string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+DONE = None
+
+
+def partition_bounds(partitions):
+    # Evenly split the first-character alphabet into `partitions` ranges.
+    # Returns the inner boundaries; range i is [bounds[i-1], bounds[i]).
+    step = len(ID_ALPHABET) / partitions
+    return [ID_ALPHABET[round(i * step)] for i in range(1, partitions)]
+
+
+class AdaptiveThrottle:
+    # Pause shared by all writers: doubles on every failed commit and decays
+    # on success, replacing a fixed sleep between batches.
+    def __init__(self, base_delay=0.25, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+    def on_success(self):
+        with self.lock:
+            self.delay = self.delay * 0.8 if self.delay > 0.01 else 0.0
+
+    def on_error(self):
+        with self.lock:
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+
+class CloneCheckpoint:
+    # Per-partition cursor of the last document copied. Batches of a partition
+    # can finish out of order, so the cursor only moves over a contiguous run.
+    def __init__(self, file_path, bounds):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.bounds = bounds
+        self.partitions = {}
+        if file_path and os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                state = json.load(f)
+            # Keep the original ranges so the saved cursors stay meaningful
+            self.bounds = state['bounds']
+            self.partitions = {int(k): v for k, v in state['partitions'].items()}
+        for p in range(len(self.bounds) + 1):
+            self.partitions.setdefault(p, {'last': None, 'done': False, 'copied': 0})
+        self.completed = {p: {} for p in self.partitions}
+        self.next_seq = {p: 0 for p in self.partitions}
+
+    def range(self, partition):
+        start = self.bounds[partition - 1] if partition > 0 else None
+        end = self.bounds[partition] if partition < len(self.bounds) else None
+        return start, end
+
+    def mark(self, partition, seq, last_id, count):
+        with self.lock:
+            self.completed[partition][seq] = (last_id, count)
+            state = self.partitions[partition]
+            while self.next_seq[partition] in self.completed[partition]:
+                last_id, count = self.completed[partition].pop(self.next_seq[partition])
+                self.next_seq[partition] += 1
+                if last_id is DONE:
+                    state['done'] = True
+                else:
+                    state['last'] = last_id
+                    state['copied'] += count
+            self.save()
+
+    def save(self):
+        if not self.file_path:
+            return
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'bounds': self.bounds, 'partitions': self.partitions}, f)
+        os.replace(tmp_path, self.file_path)
+
+    def copied(self):
+        return sum(state['copied'] for state in self.partitions.values())
+
+    def all_done(self):
+        return all(state['done'] for state in self.partitions.values())
+
+
+def read_partition(source, checkpoint, partition, work, batch_size, errors):
+    start, end = checkpoint.range(partition)
+    after = checkpoint.partitions[partition]['last']
+    seq = 0
     try:
-        batch.commit()
-        batch_success = len(current_batch_docs)
-        success += batch_success
-        print(f"✅ Batch {i//write_batch_size + 1} committed successfully: {success}/{total_docs} documents copied")
+        for page in source.iter_range(start, end, after, page_size=batch_size):
+            work.put((partition, seq, page))
+            seq += 1
     except Exception as e:
-        errors += len(current_batch_docs)
-        print(f"❌ Error committing batch {i//write_batch_size + 1}: {e}")
-    
-    # Small pause between batches to avoid throttling
-    time.sleep(0.5)
-
-print(f"\nComplete! Copied {success} documents with {errors} errors")
-
-# Clean up
-firebase_admin.delete_app(source_app)
-firebase_admin.delete_app(target_app)
-print("Done!")
\ No newline at end of file
+        errors.append(f"Reader for partition {partition} failed: {e}")
+        return
+    work.put((partition, seq, DONE))
+
+
+def write_worker(sink, checkpoint, work, throttle, retries, errors):
+    while True:
+        item = work.get()
+        if item is None:
+            return
+        partition, seq, page = item
+        if page is DONE:
+            checkpoint.mark(partition, seq, DONE, 0)
+            continue
+        for attempt in range(retries + 1):
+            throttle.wait()
+            try:
+                sink.commit(page)
+                throttle.on_success()
+                checkpoint.mark(partition, seq, page[-1][0], len(page))
+                break
+            except Exception as e:
+                throttle.on_error()
+                print(f"❌ Error committing batch (partition {partition}, attempt {attempt + 1}): {e}")
+        else:
+            # Leaving this seq unmarked stops the partition's cursor here, so a
+            # rerun copies this batch again.
+            errors.append(f"Batch {seq} of partition {partition} failed after {retries + 1} attempts")
+
+
+def clone(source, sink, checkpoint, readers=4, writers=8, batch_size=BATCH_LIMIT, queue_size=16, retries=8):
+    work = queue.Queue(maxsize=queue_size)
+    throttle = AdaptiveThrottle()
+    errors = []
+
+    writer_threads = [threading.Thread(target=write_worker, args=(sink, checkpoint, work, throttle, retries, errors),
+                                       daemon=True) for _ in range(writers)]
+    for thread in writer_threads:
+        thread.start()
+
+    pending = [p for p, state in checkpoint.partitions.items() if not state['done']]
+    pending_lock = threading.Lock()
+
+    def reader_loop():
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                partition = pending.pop(0)
+            read_partition(source, checkpoint, partition, work, batch_size, errors)
+
+    reader_threads = [threading.Thread(target=reader_loop, daemon=True) for _ in range(readers)]
+    for thread in reader_threads:
+        thread.start()
+
+    last_report = time.monotonic()
+    while any(thread.is_alive() for thread in reader_threads):
+        time.sleep(0.2)
+        if time.monotonic() - last_report > 5:
+            last_report = time.monotonic()
+            print(f"Copied {checkpoint.copied()} documents so far (queue {work.qsize()}, "
+                  f"throttle {throttle.delay:.2f}s)")
+
+    for _ in writer_threads:
+        work.put(None)
+    for thread in writer_threads:
+        thread.join()
+    return errors
+
+
+def fake_source(count, seed=0):
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    source = MemorySink()
+    for i in range(count):
+        doc_id = ''.join(rng.choice(alphabet) for _ in range(20))
+        source.docs[doc_id] = {'word': f'word{i}', 'index': i, 'difficulty': 'beginner'}
+    return source
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy the words collection into another database.')
+    parser.add_argument('--collection', default='words')
+    parser.add_argument('--target-database', default='sj-eloquent-prod')
+    parser.add_argument('--partitions', type=int, default=8,
+                        help='Number of document-ID ranges read in parallel (default: 8)')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=BATCH_LIMIT)
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help='Batches buffered between readers and writers (default: 16)')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the checkpoint and copy everything again')
+    parser.add_argument('--fake', type=int, metavar='DOCS',
+                        help='Clone between in-process fakes holding this many documents')
+    parser.add_argument('--fake-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print("Starting pipelined database copy...")
+    checkpoint_file = None if args.fake else 'clone_progress.json'
+    if args.restart and checkpoint_file and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    checkpoint = CloneCheckpoint(checkpoint_file, partition_bounds(args.partitions))
+
+    if args.fake:
+        source = fake_source(args.fake)
+        source.latency = args.fake_latency
+        sink = MemorySink(latency=args.fake_latency)
+    else:
+        source_db = init_firestore(app_name="source")
+        print("Connected to source database (default)")
+        target_db = init_firestore(app_name="target", database_id=args.target_database)
+        print(f"Connected to target database ({args.target_database})")
+        source = FirestoreSource(source_db, args.collection)
+        sink = FirestoreSink(target_db, args.collection)
+
+    copied_before = checkpoint.copied()
+    if copied_before:
+        print(f"Resuming: {copied_before} documents already copied")
+
+    start = time.perf_counter()
+    errors = clone(source, sink, checkpoint, args.readers, args.writers,
+                   min(args.batch_size, BATCH_LIMIT), args.queue_size)
+    elapsed = time.perf_counter() - start
+    copied = checkpoint.copied() - copied_before
+
+    print(f"\nComplete! Copied {copied} documents in {elapsed:.1f}s "
+          f"({copied / max(elapsed, 1e-9):.0f} docs/s) with {len(errors)} errors")
+    for error in errors:
+        print(f"❌ {error}")
+    if checkpoint.all_done() and not errors:
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        print("Done!")
+    else:
+        print("Re-run to resume from the saved cursors.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,99 @@
+import argparse
 import json
-import re
+import os
+from multiprocessing import Pool
+from journal import read_records
+from swear_matcher import SwearMatcher
 
 def load_json(filename):
     with open(filename, 'r', encoding='utf-8') as file:
         return json.load(file)
 
-def check_swears(text, swears):
-    words = re.findall(r'\b\w+\b', text.lower())
-    for swear in swears:
-        if swear.lower() in words:
-            return swear
-    return None
+def check_swears(text, matcher):
+    return matcher.find(text)
 
-def process_word_data(word_data, swears):
-    detected_swear = check_swears(word_data['word'], swears)
+def process_word_data(word_data, matcher):
+    detected_swear = check_swears(word_data['word'], matcher)
     if detected_swear:
         return detected_swear, 'word'
 
-    detected_swear = check_swears(word_data['definition'], swears)
+    detected_swear = check_swears(word_data['definition'], matcher)
     if detected_swear:
         return detected_swear, 'definition'
 
     for example in word_data['examples']:
-        detected_swear = check_swears(example, swears)
+        detected_swear = check_swears(example, matcher)
         if detected_swear:
             return detected_swear, 'example'
 
     for synonym in word_data['synonyms']:
-        detected_swear = check_swears(synonym, swears)
+        detected_swear = check_swears(synonym, matcher)
         if detected_swear:
             return detected_swear, 'synonym'
 
     for antonym in word_data['antonyms']:
-        detected_swear = check_swears(antonym, swears)
+        detected_swear = check_swears(antonym, matcher)
         if detected_swear:
             return detected_swear, 'antonym'
 
     return None, None
 
-def main():
-    swears = load_json('swears.json')
-    processed_words = load_json('processed_words.json')
+_worker_matcher = None
+
+def init_worker(swears, leet):
+    global _worker_matcher
+    _worker_matcher = SwearMatcher(swears, leet=leet)
 
-    for word_data in processed_words:
-        detected_swear, location = process_word_data(word_data, swears)
+def scan_chunk(chunk):
+    start, entries = chunk
+    matches = []
+    for offset, word_data in enumerate(entries):
+        detected_swear, location = process_word_data(word_data, _worker_matcher)
         if detected_swear:
-            print(f"Detected swear: '{detected_swear}' in {location}")
-            print(json.dumps(word_data, indent=2))
+            matches.append({'index': start + offset, 'word': word_data['word'],
+                            'swear': detected_swear, 'location': location})
+    return matches
+
+def scan(processed_words, swears, leet=False, workers=1, chunk_size=2000):
+    chunks = ((i, processed_words[i:i + chunk_size]) for i in range(0, len(processed_words), chunk_size))
+    if workers <= 1:
+        init_worker(swears, leet)
+        results = map(scan_chunk, chunks)
+        return [match for matches in results for match in matches]
+    with Pool(workers, initializer=init_worker, initargs=(swears, leet)) as pool:
+        return [match for matches in pool.imap(scan_chunk, chunks) for match in matches]
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan processed words for profanity.')
+    parser.add_argument('--input', default='processed_words.json',
+                        help='Word entries as a JSON array or JSON Lines')
+    parser.add_argument('--swears', default='swears.json')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of scanning processes (default: CPU count)')
+    parser.add_argument('--leet', action='store_true',
+                        help='Also match leetspeak spellings such as "5h1t"')
+    parser.add_argument('--report', default=None,
+                        help='Write a JSON report of all matches to this file')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Do not print the flagged entries')
+    args = parser.parse_args()
+
+    swears = load_json(args.swears)
+    processed_words = list(read_records(args.input))
+
+    matches = scan(processed_words, swears, leet=args.leet, workers=args.workers)
+
+    if not args.quiet:
+        for match in matches:
+            print(f"Detected swear: '{match['swear']}' in {match['location']}")
+            print(json.dumps(processed_words[match['index']], indent=2))
             print('-' * 50)
 
+    if args.report:
+        report = {'total': len(processed_words), 'flagged': len(matches), 'leet': args.leet, 'matches': matches}
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Flagged {len(matches)} of {len(processed_words)} entries. Report saved to {args.report}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
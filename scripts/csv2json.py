@@ -1,20 +1,97 @@
+import argparse
+import ast
 import csv
 import json
-import ast
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+
+def parse_word_info(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # Older scrapes stored the Python repr of the response instead of JSON
+        return ast.literal_eval(text)
+
+
+def convert_row(row):
+    row['WordInfo'] = parse_word_info(row['WordInfo'])
+    return row
+
+
+def convert_chunk(rows):
+    return [convert_row(row) for row in rows]
+
+
+def read_rows(file_path):
+    with open(file_path, 'r', newline='') as in_file:
+        yield from csv.DictReader(in_file)
+
+
+def read_cache(file_path):
+    from http_cache import ScrapeCache
+
+    cache = ScrapeCache(file_path)
+    try:
+        for word, word_info in cache.iter_entries():
+            yield {'Word': word, 'WordInfo': word_info}
+    finally:
+        cache.close()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_rows(rows, workers=1, chunk_size=1000):
+    if workers <= 1:
+        yield from map(convert_row, rows)
+        return
+    # Keep only a few chunks in flight so memory stays flat however large the
+    # input is; results come back in input order.
+    with Pool(workers) as pool:
+        in_flight = deque()
+        for chunk in chunked(rows, chunk_size):
+            in_flight.append(pool.apply_async(convert_chunk, (chunk,)))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().get()
+        while in_flight:
+            yield from in_flight.popleft().get()
+
+
+def write_jsonl(file_path, records):
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as out_file:
+        for record in records:
+            out_file.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a scrape CSV into JSON Lines.')
+    parser.add_argument('--input', default='final_scrape_no_capital.csv')
+    parser.add_argument('--output', default='final_scrape_no_capital.jsonl')
+    parser.add_argument('--from-cache', metavar='CACHE_FILE',
+                        help='Read responses from the scrape cache instead of a CSV')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse rows in this many processes (default: 1)')
+    args = parser.parse_args()
+
+    if args.from_cache:
+        records = read_cache(args.from_cache)
+    else:
+        records = convert_rows(read_rows(args.input), workers=args.workers)
+
+    count = write_jsonl(args.output, records)
+    print(f"Wrote {count} rows to {args.output}")
+
 
-# Open the CSV file and create a CSV reader
-with open('final_scrape_no_capital.csv', 'r') as in_file:
-    reader = csv.DictReader(in_file)
-    
-    # Initialize an empty list to store the rows
-    data = []
-    
-    # Iterate through each row in the CSV
-    for row in reader:
-        # Convert the string in 'WordInfo' back to a dictionary
-        row['WordInfo'] = ast.literal_eval(row['WordInfo'])
-        data.append(row)
-        
-# Write the data to a JSON file
-with open('final_scrape_no_capital.json', 'w') as out_file:
-    json.dump(data, out_file)
+if __name__ == '__main__':
+    main()
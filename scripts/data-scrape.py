@@ -1,36 +1,200 @@
+import argparse
+import asyncio
 import csv
-import requests
+import json
+import os
 import re
-import time
-
-# Open your text file and create a CSV writer
-with open('word-frequency.txt', 'r') as in_file, open('final_scrape_pending.csv', 'w', newline='') as out_file:
-    reader = csv.reader(in_file, delimiter='\t')
-    writer = csv.writer(out_file)
-    
-    # Write the header row to the output CSV
-    writer.writerow(['Word', 'WordInfo'])
-    
-    # Initialize a counter for the number of rows written to the output CSV
-    row_count = 0
-    
-    # Iterate through each row in the text file
-    for row in list(reader):
-        row = re.split('\s+', row[0].strip())
-        word = row[1]  # assuming the word is the second column
-        
-        # Ping the API with the word
-        response = requests.get(f'https://api.dictionaryapi.dev/api/v2/entries/en/{word}')
-
-        while response.status_code == 429:
-            # Wait for 5 minutes before trying again
-            print('Too many requests. Waiting for 30s...')
-            time.sleep(30)
-            response = requests.get(f'https://api.dictionaryapi.dev/api/v2/entries/en/{word}')
-    
-        if response.status_code == 200:
-            # Write the word and the response to the output CSV
-            wordInfo = response.json()  # replace this with actual extraction of wordInfo from the response
-            print(wordInfo)
-            writer.writerow([word, wordInfo])
-            row_count += 1
\ No newline at end of file
+from collections import deque
+
+from dictionary_client import DICTIONARY_API, TokenBucket, fetch_word, make_session
+from http_cache import DAY, ScrapeCache
+
+
+def load_words(file_path):
+    words = []
+    with open(file_path, 'r') as in_file:
+        reader = csv.reader(in_file, delimiter='\t')
+        for row in reader:
+            row = re.split(r'\s+', row[0].strip())
+            words.append(row[1])  # assuming the word is the second column
+    return words
+
+
+def load_progress(file_path):
+    # Returns (index, output offset). The offset is the CSV's size when the
+    # index was saved; files from older runs only hold the index.
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            fields = f.read().split()
+        if fields:
+            return int(fields[0]), int(fields[1]) if len(fields) > 1 else None
+    return 0, None
+
+
+def save_progress(file_path, index, offset):
+    with open(file_path, 'w') as f:
+        f.write(f"{index} {offset}")
+
+
+def load_failed(file_path):
+    # Words that failed on an earlier run, one per line, in the order they
+    # failed
+    if os.path.exists(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return list(dict.fromkeys(line.rstrip('\n') for line in f if line.strip()))
+    return []
+
+
+def save_failed(file_path, words):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(f"{word}\n" for word in words)
+    os.replace(tmp_path, file_path)
+
+
+async def fetch_cached(session, word, limiter, base_url, cache):
+    if cache is not None:
+        cached = cache.get(word)
+        if cached:
+            return cached
+    status, body = await fetch_word(session, word, limiter, base_url)
+    # Only definitive answers are cached; 404s act as negative entries.
+    if cache is not None and status in (200, 404):
+        cache.put(word, status, body)
+    return status, body
+
+
+async def scrape(words, start_index, on_result, concurrency, rate, base_url, cache=None):
+    limiter = TokenBucket(rate)
+    # Requests run concurrently, but results are handed back in input order so
+    # the progress index always points just past the last completed word.
+    window = concurrency * 4
+    pending = deque()
+    async with make_session(concurrency) as session:
+        try:
+            for i in range(start_index, len(words)):
+                task = asyncio.create_task(fetch_cached(session, words[i], limiter, base_url, cache))
+                pending.append((i, task))
+                if len(pending) >= window:
+                    index, task = pending.popleft()
+                    on_result(index, words[index], *await task)
+            while pending:
+                index, task = pending.popleft()
+                on_result(index, words[index], *await task)
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape dictionary entries for every word in word-frequency.txt.')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum simultaneous requests (default: 8)')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='Initial requests per second; adapts to 429 responses (default: 5)')
+    parser.add_argument('--base-url', default=DICTIONARY_API,
+                        help='Dictionary API endpoint, e.g. a local stub server')
+    parser.add_argument('--ttl-days', type=float, default=None,
+                        help='Refetch cached entries older than this (default: never)')
+    parser.add_argument('--negative-ttl-days', type=float, default=30,
+                        help='Refetch cached 404s older than this (default: 30)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always fetch from the network and do not record responses')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore saved progress and walk the whole word list again')
+    parser.add_argument('--input', default='word-frequency.txt')
+    parser.add_argument('--output', default='final_scrape_pending.csv')
+    args = parser.parse_args()
+
+    input_file = args.input
+    output_file = args.output
+    progress_file = 'scrape_progress.txt'
+    failed_file = 'scrape_failed.txt'
+    cache_file = 'scrape_cache.sqlite'
+
+    words = load_words(input_file)
+    start_index, offset = (0, None) if args.restart else load_progress(progress_file)
+    resuming = start_index > 0 and os.path.exists(output_file)
+    if not resuming:
+        start_index = 0
+    # Progress moves past words that failed; they are kept here and tried
+    # again before the rest on the next run
+    failed = dict.fromkeys(load_failed(failed_file) if resuming else [])
+
+    print(f"Total words: {len(words)}")
+    print(f"Starting from index: {start_index}")
+
+    cache = None
+    if not args.no_cache:
+        cache = ScrapeCache(cache_file,
+                            ttl=args.ttl_days * DAY if args.ttl_days is not None else None,
+                            negative_ttl=args.negative_ttl_days * DAY)
+
+    with open(output_file, 'r+' if resuming else 'w', newline='') as out_file:
+        if resuming:
+            # Rows written after the last checkpoint are fetched again, so
+            # drop them rather than appending duplicates
+            if offset is not None:
+                out_file.truncate(offset)
+            out_file.seek(0, os.SEEK_END)
+        writer = csv.writer(out_file)
+        if not resuming:
+            # Write the header row to the output CSV
+            writer.writerow(['Word', 'WordInfo'])
+
+        completed = start_index
+
+        def checkpoint():
+            out_file.flush()
+            if cache is not None:
+                cache.commit()
+            save_progress(progress_file, completed, out_file.tell())
+            save_failed(failed_file, failed)
+
+        def record(word, status, body):
+            if status == 200:
+                try:
+                    wordInfo = json.loads(body)
+                except json.JSONDecodeError:
+                    print(f"'{word}' returned a body that isn't JSON; will retry next run")
+                    failed[word] = None
+                    return
+                # Stored as JSON (not the Python repr) so csv2json can parse it quickly
+                writer.writerow([word, json.dumps(wordInfo)])
+            elif status is None:
+                print(f"Giving up on '{word}' for this run")
+                failed[word] = None
+                return
+            failed.pop(word, None)
+
+        def on_result(i, word, status, body):
+            nonlocal completed
+            record(word, status, body)
+            completed = i + 1
+            if completed % 50 == 0:
+                checkpoint()
+
+        def on_retry(i, word, status, body):
+            record(word, status, body)
+
+        try:
+            retry = list(failed)
+            if retry:
+                print(f"Retrying {len(retry)} words that failed last time")
+                asyncio.run(scrape(retry, 0, on_retry, args.concurrency, args.rate, args.base_url, cache))
+                checkpoint()
+            asyncio.run(scrape(words, start_index, on_result, args.concurrency, args.rate,
+                               args.base_url, cache))
+        except KeyboardInterrupt:
+            print("\nScrape interrupted. Saving progress...")
+        finally:
+            checkpoint()
+            if cache is not None:
+                cache.close()
+            print(f"Completed {completed} of {len(words)} words")
+            if failed:
+                print(f"{len(failed)} words failed; they are listed in {failed_file} and retried on the next run")
+
+
+if __name__ == '__main__':
+    main()
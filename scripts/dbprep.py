@@ -1,13 +1,10 @@
+import argparse
 import json
+import re
+from collections import deque
+from multiprocessing import Pool
 
-import pandas as pd
-
-
-# Load the json file
-with open("final_scrape_no_capital.json") as f:
-    data = json.load(f)
-
-df = pd.json_normalize(data)
+from csv2json import chunked
 
 
 def clean_list(l):
@@ -68,12 +65,108 @@ def extract_info(word_info_list):
     return output_info
 
 
-# Apply the function to each row
-df_info = df["WordInfo"].apply(extract_info)
+def process_record(record):
+    return {"Word": record["Word"], **extract_info(record["WordInfo"])}
+
+
+def process_chunk(lines):
+    return [process_record(json.loads(line)) for line in lines]
+
+
+def read_lines(file_path):
+    with open(file_path) as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def extract_records(file_path, workers=1, chunk_size=2000):
+    # Streams processed records in input order, parsing and extracting chunks
+    # of JSONL in a process pool with only a few chunks in flight.
+    if workers <= 1:
+        for lines in chunked(read_lines(file_path), chunk_size):
+            yield from process_chunk(lines)
+        return
+    with Pool(workers) as pool:
+        in_flight = deque()
+        for lines in chunked(read_lines(file_path), chunk_size):
+            in_flight.append(pool.apply_async(process_chunk, (lines,)))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().get()
+        while in_flight:
+            yield from in_flight.popleft().get()
+
+
+# json.dumps escapes DEL as \u007f; pandas writes the raw character. The
+# lookbehind skips an escaped backslash followed by the text "u007f".
+DEL_ESCAPE_RE = re.compile(r"(?<!\\)((?:\\\\)*)\\u007f")
+
+
+def encode_record(record):
+    # Matches DataFrame.to_json(orient="records"): compact, ASCII-only and
+    # with escaped forward slashes, so the output is byte-identical.
+    encoded = json.dumps(record, separators=(",", ":")).replace("/", "\\/")
+    if "\\u007f" in encoded:
+        encoded = DEL_ESCAPE_RE.sub("\\1\x7f", encoded)
+    return encoded
+
+
+def write_records(file_path, records, jsonl=False):
+    count = 0
+    with open(file_path, "w") as out_file:
+        if not jsonl:
+            out_file.write("[")
+        for record in records:
+            if jsonl:
+                out_file.write(json.dumps(record) + "\n")
+            else:
+                out_file.write(("," if count else "") + encode_record(record))
+            count += 1
+        if not jsonl:
+            out_file.write("]")
+    return count
+
+
+def run_pandas(input_file, output_file):
+    # The original in-memory implementation, kept for comparison benchmarks.
+    import pandas as pd
+
+    with open(input_file) as f:
+        data = [json.loads(line) for line in f]
+
+    df = pd.json_normalize(data)
+
+    # Apply the function to each row
+    df_info = df["WordInfo"].apply(extract_info)
+
+    # Convert the Series of dicts to a DataFrame and concatenate with original data
+    df_info = pd.DataFrame(df_info.tolist())
+    df_final = pd.concat([df["Word"], df_info], axis=1)
+
+    # Write the new data to a json file
+    df_final.to_json(output_file, orient="records")
+    return len(df_final)
+
 
-# Convert the Series of dicts to a DataFrame and concatenate with original data
-df_info = pd.DataFrame(df_info.tolist())
-df_final = pd.concat([df["Word"], df_info], axis=1)
+def main():
+    parser = argparse.ArgumentParser(description="Extract word data from the scraped dictionary entries.")
+    parser.add_argument("--input", default="final_scrape_no_capital.jsonl")
+    parser.add_argument("--output", default=None,
+                        help="Defaults to word_data_processed.json (.jsonl with --jsonl)")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write one record per line instead of a JSON array")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Extract in this many processes (default: 1)")
+    parser.add_argument("--engine", choices=["stream", "pandas"], default="stream")
+    args = parser.parse_args()
 
-# Write the new data to a json file
-df_final.to_json("word_data_processed.json", orient="records")
+    output_file = args.output or ("word_data_processed.jsonl" if args.jsonl else "word_data_processed.json")
+    if args.engine == "pandas":
+        count = run_pandas(args.input, output_file)
+    else:
+        count = write_records(output_file, extract_records(args.input, args.workers), jsonl=args.jsonl)
+    print(f"Wrote {count} words to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
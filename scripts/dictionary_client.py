@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+import aiohttp
+
+DICTIONARY_API = 'https://api.dictionaryapi.dev/api/v2/entries/en'
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    # Rate limiter that adapts to the server: the rate is halved on every 429
+    # (and all callers pause for Retry-After) and creeps back up on success.
+    def __init__(self, rate, burst=None, min_rate=0.5, max_rate=None, default_backoff=30.0):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self.default_backoff = default_backoff
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_rate_limited(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        wait = self.default_backoff if retry_after is None else retry_after
+        self.paused_until = max(self.paused_until, time.monotonic() + wait)
+
+
+def make_session(concurrency, timeout=30):
+    # One pooled keep-alive connector shared by every request.
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
+async def fetch_word(session, word, limiter, base_url=DICTIONARY_API, max_retries=8):
+    # Returns (status, body); status is None if every attempt failed. 429s
+    # don't use up attempts: the limiter slows down until they stop.
+    url = f"{base_url}/{quote(word)}"
+    attempt = 0
+    while attempt < max_retries:
+        await limiter.acquire()
+        try:
+            async with session.get(url) as response:
+                body = await response.text()
+                if response.status == 429:
+                    limiter.on_rate_limited(parse_retry_after(response.headers.get('Retry-After')))
+                    continue
+                attempt += 1
+                if response.status >= 500:
+                    await asyncio.sleep(min(30, 2 ** (attempt - 1)) * (0.5 + random.random()))
+                    continue
+                limiter.on_success()
+                return response.status, body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            attempt += 1
+            print(f"Request for '{word}' failed: {e!r}")
+            await asyncio.sleep(min(30, 2 ** (attempt - 1)) * (0.5 + random.random()))
+    return None, None
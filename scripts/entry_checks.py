@@ -0,0 +1,193 @@
+import argparse
+import re
+from collections import Counter
+
+from journal import read_records, write_jsonl
+
+# Rule-based checks run over the whole corpus before improve_quality asks
+# the model. Each failed check costs its weight; an entry's confidence is 1
+# minus the total (at least 0), and only entries below the threshold are
+# sent for verification. The checks look at the corpus as a whole, e.g. a
+# definition shared by several words is suspect.
+
+CONTRACTIONS = {
+    "'ve": "have",
+    "'s": "is",
+    "'m": "am",
+    "'re": "are",
+    "'ll": "will",
+    "'d": "would",
+    "n't": "not"
+}
+
+FIELDS = ('word', 'definition', 'wordType', 'examples', 'synonyms', 'antonyms')
+LIST_FIELDS = ('examples', 'synonyms', 'antonyms')
+
+# Text genDB's prompt shows as a template; seeing it in an entry means the
+# model copied the template instead of filling it in.
+PLACEHOLDER_RE = re.compile(r'^(a clear, concise definition|the part of speech|a sentence using |another example '
+                            r'with |a third instance of |synonym\d|antonym\d)', re.IGNORECASE)
+TOKEN_RE = re.compile(r"[a-z']+")
+
+# Regular inflections word_forms adds to a word's stems
+SUFFIXES = ('s', 'es', 'ed', 'ing', 'er', 'est', 'ly')
+SHORT_SUFFIXES = ('s', 'es', 'ing')
+VOWELS = 'aeiou'
+
+# Every weight exceeds 1 - MIN_CONFIDENCE, so at the default threshold any
+# failed check flags an entry; a lower --min-confidence tolerates the
+# lighter ones.
+WEIGHTS = {
+    'missing_field': 1.0,
+    'wrong_type': 1.0,
+    'example_count': 0.5,
+    'placeholder': 0.5,
+    'empty_definition': 0.5,
+    'short_definition': 0.3,
+    'duplicate_definition': 0.3,
+    'contraction_definition': 0.3,
+    'duplicate_example': 0.3,
+    'word_not_in_example': 0.25,
+    'self_synonym': 0.25,
+    'self_antonym': 0.25,
+    'synonym_is_antonym': 0.25,
+}
+
+MIN_CONFIDENCE = 0.8
+
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall(text.lower()))
+
+
+def word_forms(word):
+    # Tokens that count as the word appearing in a sentence: the word itself
+    # and its regular inflections, built from the stems they share (make ->
+    # mak-ing, carry -> carri-ed, stop -> stopp-ed). One- and two-letter words
+    # only take the few endings that can't turn them into another word.
+    word = word.lower()
+    if len(word) < 3:
+        return {word} | ({word + suffix for suffix in SHORT_SUFFIXES} if len(word) == 2 else set())
+    stems = {word}
+    if word.endswith('e'):
+        stems.add(word[:-1])
+    if word.endswith('y') and word[-2] not in VOWELS:
+        stems.add(word[:-1] + 'i')
+    if word[-1] not in VOWELS + 'wxy' and word[-2] in VOWELS and word[-3] not in VOWELS:
+        stems.add(word + word[-1])
+    return {word} | {stem + suffix for stem in stems for suffix in SUFFIXES}
+
+
+def uses_word(example, word, forms):
+    if word in CONTRACTIONS:
+        return word in example.lower().replace('’', "'")
+    # Quotes around the word ('river') and a possessive (the river's) still
+    # count as using it
+    tokens = (token.strip("'") for token in TOKEN_RE.findall(example.lower().replace('’', "'")))
+    return any(token in forms or token.split("'")[0] in forms for token in tokens)
+
+
+def entry_issues(entry):
+    # Checks that need only the entry itself
+    issues = []
+    missing = [field for field in FIELDS if field not in entry]
+    issues.extend(f'missing_field:{field}' for field in missing)
+    for field in FIELDS:
+        if field in missing:
+            continue
+        expected = list if field in LIST_FIELDS else str
+        value = entry[field]
+        if not isinstance(value, expected) or (expected is list and not all(isinstance(v, str) for v in value)):
+            issues.append(f'wrong_type:{field}')
+    if any(issue.startswith(('missing_field:word', 'wrong_type:word')) for issue in issues):
+        return issues
+
+    word = entry['word']
+    key = word.lower()
+    definition = entry.get('definition') if isinstance(entry.get('definition'), str) else ''
+    examples = [e for e in entry.get('examples') or [] if isinstance(e, str)]
+    synonyms = [s.lower().strip() for s in entry.get('synonyms') or [] if isinstance(s, str)]
+    antonyms = [a.lower().strip() for a in entry.get('antonyms') or [] if isinstance(a, str)]
+
+    if 'examples' not in missing and len(examples) != 3:
+        issues.append('example_count')
+    if any(PLACEHOLDER_RE.match(text) for text in [definition, str(entry.get('wordType', ''))] + examples):
+        issues.append('placeholder')
+
+    words_in_definition = len(TOKEN_RE.findall(definition.lower()))
+    if words_in_definition == 0:
+        issues.append('empty_definition')
+    elif words_in_definition < 3:
+        issues.append('short_definition')
+    if key in CONTRACTIONS and CONTRACTIONS[key] not in TOKEN_RE.findall(definition.lower()):
+        issues.append('contraction_definition')
+
+    if len({normalize(example) for example in examples}) < len(examples):
+        issues.append('duplicate_example')
+    forms = word_forms(word)
+    issues.extend('word_not_in_example' for example in examples if not uses_word(example, key, forms))
+
+    if key in synonyms:
+        issues.append('self_synonym')
+    if key in antonyms:
+        issues.append('self_antonym')
+    if set(synonyms) & set(antonyms):
+        issues.append('synonym_is_antonym')
+    return issues
+
+
+def confidence(issues):
+    penalty = sum(WEIGHTS[issue.split(':')[0]] for issue in issues)
+    return round(max(0.0, 1.0 - penalty), 2)
+
+
+def check_entries(entries):
+    # Returns [(confidence, issues)] in the order of `entries`
+    results = [entry_issues(entry) for entry in entries]
+
+    # A definition shared by several different words describes at most one
+    definitions = [normalize(entry['definition']) if isinstance(entry.get('definition'), str) else ''
+                   for entry in entries]
+    words_by_definition = {}
+    for entry, definition in zip(entries, definitions):
+        if definition and isinstance(entry.get('word'), str):
+            words_by_definition.setdefault(definition, set()).add(entry['word'].lower())
+    for issues, definition in zip(results, definitions):
+        if len(words_by_definition.get(definition, ())) > 1:
+            issues.append('duplicate_definition')
+
+    return [(confidence(issues), issues) for issues in results]
+
+
+def flagged_indexes(checks, min_confidence=MIN_CONFIDENCE):
+    return {index for index, (score, _) in enumerate(checks) if score < min_confidence}
+
+
+def summarize(checks, min_confidence=MIN_CONFIDENCE):
+    issue_counts = Counter(issue.split(':')[0] for _, issues in checks for issue in set(issues))
+    flagged = len(flagged_indexes(checks, min_confidence))
+    return flagged, issue_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the rule-based entry checks over a corpus.')
+    parser.add_argument('file', nargs='?', default='processed_words.json')
+    parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE)
+    parser.add_argument('--report', help="Write each entry's word, confidence and issues (JSONL)")
+    args = parser.parse_args()
+
+    entries = list(read_records(args.file))
+    checks = check_entries(entries)
+    flagged, issue_counts = summarize(checks, args.min_confidence)
+    print(f"{flagged} of {len(entries)} entries ({flagged / max(len(entries), 1):.1%}) are below confidence "
+          f"{args.min_confidence}")
+    for issue, count in issue_counts.most_common():
+        print(f"  {issue}: {count}")
+    if args.report:
+        count = write_jsonl(args.report, ({'word': entry.get('word'), 'confidence': score, 'issues': issues}
+                                          for entry, (score, issues) in zip(entries, checks)))
+        print(f"Wrote {count} entries to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import os
+from itertools import groupby
+
+from firestore_io import FirestoreSink, MemorySink, init_firestore, write_batches
+from uploadToDb import build_docs, difficulties, load_ranking, load_words
+
+# Groups consecutive words of a difficulty into "pack" documents, so the app
+# can load a whole session's worth of words with one read instead of one read
+# per word.
+
+MAX_DOC_BYTES = 1024 * 1024
+# Headroom for the document name and anything the estimate misses
+PACK_BUDGET = MAX_DOC_BYTES - 64 * 1024
+# Firestore also caps the total size of one commit request
+MAX_COMMIT_BYTES = 9 * 1024 * 1024
+
+
+def value_size(value):
+    # Storage size as Firestore counts it: strings are UTF-8 bytes + 1,
+    # numbers 8, booleans and null 1, arrays and maps the sum of their parts.
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(len(key.encode('utf-8')) + 1 + value_size(item) for key, item in value.items())
+    raise TypeError(f"Unsupported value type: {type(value)}")
+
+
+def document_size(doc_id, data, collection):
+    name = f"{collection}/{doc_id}"
+    return len(name.encode('utf-8')) + 16 + value_size(data) + 32
+
+
+def pack_entry(doc_id, doc):
+    entry = {key: value for key, value in doc.items() if key != 'difficulty'}
+    entry['id'] = doc_id
+    return entry
+
+
+def make_pack(difficulty, entries):
+    encoded = json.dumps(entries, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return {
+        'difficulty': difficulty,
+        'startIndex': entries[0]['index'],
+        'endIndex': entries[-1]['index'],
+        'count': len(entries),
+        # Content hash: clients can keep a cached pack until this changes
+        'version': hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16],
+        'words': entries,
+    }
+
+
+def build_packs(docs, pack_size=100, budget=PACK_BUDGET):
+    # Yields (pack_id, pack). Packs cover aligned runs of `pack_size` indices
+    # within a difficulty, so an edit only changes the pack it falls in; a run
+    # that would exceed `budget` is split into several packs.
+    fixed_fields = value_size(make_pack('expert', [{'index': 0}])) - value_size([{'index': 0}])
+    by_difficulty = sorted(docs, key=lambda item: (difficulties.index(item[1]['difficulty']), item[1]['index']))
+    runs = groupby(by_difficulty, key=lambda item: (item[1]['difficulty'], item[1]['index'] // pack_size))
+    for (difficulty, _), group in runs:
+        entries = []
+        size = fixed_fields
+        for doc_id, doc in group:
+            entry = pack_entry(doc_id, doc)
+            entry_size = value_size(entry)
+            if entry_size + fixed_fields > budget:
+                raise ValueError(f"Word '{doc_id}' alone exceeds the pack size budget")
+            if entries and size + entry_size > budget:
+                yield f"{difficulty}-{entries[0]['index']:06d}", make_pack(difficulty, entries)
+                entries = []
+                size = fixed_fields
+            entries.append(entry)
+            size += entry_size
+        if entries:
+            yield f"{difficulty}-{entries[0]['index']:06d}", make_pack(difficulty, entries)
+
+
+def build_pack_index(packs):
+    # One small document per difficulty listing every pack's range and
+    # version, so a client can find and validate cached packs with one read.
+    index = {}
+    for pack_id, pack in packs:
+        index.setdefault(pack['difficulty'], []).append({
+            'id': pack_id, 'startIndex': pack['startIndex'], 'endIndex': pack['endIndex'],
+            'count': pack['count'], 'version': pack['version'],
+        })
+    return {difficulty: {'difficulty': difficulty, 'packs': entries} for difficulty, entries in index.items()}
+
+
+def size_batches(ops, collection, max_ops=500, max_bytes=MAX_COMMIT_BYTES):
+    batch = []
+    size = 0
+    batch_number = 0
+    for doc_id, data in ops:
+        op_size = document_size(doc_id, data, collection)
+        if batch and (len(batch) >= max_ops or size + op_size > max_bytes):
+            yield batch_number, batch
+            batch_number += 1
+            batch = []
+            size = 0
+        batch.append((doc_id, data))
+        size += op_size
+    if batch:
+        yield batch_number, batch
+
+
+def load_versions(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export words as precomputed packs for the app.')
+    parser.add_argument('--input', default='processed_words.json')
+    parser.add_argument('--ranking',
+                        help='Ranking table from rank_words.py (e.g. word_ranking.csv); file order without one')
+    parser.add_argument('--pack-size', type=int, default=100,
+                        help='Consecutive indices per pack (default: 100)')
+    parser.add_argument('--collection', default='wordPacks')
+    parser.add_argument('--index-collection', default='wordPackIndex')
+    parser.add_argument('--output', help='Also write every pack to this JSONL file')
+    parser.add_argument('--all', action='store_true',
+                        help='Write every pack, not only those whose version changed')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--emulator', metavar='HOST:PORT')
+    parser.add_argument('--fake', action='store_true',
+                        help='Write to an in-process fake backend (pack_versions.json is not used)')
+    args = parser.parse_args()
+
+    versions_file = 'pack_versions.json'
+    packs = list(build_packs(build_docs(load_words(args.input), load_ranking(args.ranking)), args.pack_size))
+    sizes = [document_size(pack_id, pack, args.collection) for pack_id, pack in packs]
+    words = sum(pack['count'] for _, pack in packs)
+    print(f"{words} words in {len(packs)} packs; largest pack {max(sizes, default=0) / 1024:.0f} KiB "
+          f"(limit {MAX_DOC_BYTES // 1024} KiB)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for pack_id, pack in packs:
+                f.write(json.dumps({'id': pack_id, **pack}, ensure_ascii=False) + '\n')
+        print(f"Packs written to {args.output}")
+
+    # The fake store starts empty on every run, so every pack is new to it
+    versions = {} if args.all or args.fake else load_versions(versions_file)
+    changed = [(pack_id, pack) for pack_id, pack in packs if versions.get(pack_id) != pack['version']]
+    stale = sorted(set(versions) - {pack_id for pack_id, _ in packs})
+    print(f"{len(changed)} packs to write, {len(stale)} to delete")
+    if args.dry_run:
+        return
+
+    if args.fake:
+        pack_sink = index_sink = MemorySink()
+    else:
+        db = init_firestore(emulator=args.emulator)
+        pack_sink = FirestoreSink(db, args.collection)
+        index_sink = FirestoreSink(db, args.index_collection)
+
+    ops = changed + [(pack_id, None) for pack_id in stale]
+    failed = write_batches(pack_sink, size_batches(ops, args.collection))
+    if failed:
+        print(f"{len(failed)} pack batches failed; the pack index was not updated. Re-run to retry.")
+        return
+    failed = write_batches(index_sink, size_batches(build_pack_index(packs).items(), args.index_collection))
+    if failed:
+        print("Writing the pack index failed. Re-run to retry.")
+        return
+
+    if not args.fake:
+        with open(versions_file, 'w') as f:
+            json.dump({pack_id: pack['version'] for pack_id, pack in packs}, f)
+    print(f"Wrote {len(changed)} packs and deleted {len(stale)}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote
+
+# Firestore allows at most 500 writes in one batch
+BATCH_LIMIT = 500
+
+
+def word_doc_id(word):
+    # Deterministic document ID for a word, so re-running an upload overwrites
+    # instead of duplicating. Firestore IDs may not contain '/', be '.' or '..',
+    # or look like '__x__', which percent-encoding plus a prefix rules out.
+    doc_id = quote(word.strip().lower(), safe="'-")
+    if doc_id in ('', '.', '..') or (doc_id.startswith('__') and doc_id.endswith('__')):
+        doc_id = 'w' + doc_id.encode('utf-8').hex()
+    return doc_id
+
+
+def init_firestore(credentials_path='../serviceAccountKey.json', emulator=None,
+                   project_id='eloquent-sj', app_name=None, database_id=None):
+    # Returns a Firestore client for the live project, or for the local
+    # emulator when `emulator` is a host:port.
+    if emulator:
+        from google.cloud import firestore as cloud_firestore
+
+        os.environ['FIRESTORE_EMULATOR_HOST'] = emulator
+        kwargs = {'database': database_id} if database_id else {}
+        return cloud_firestore.Client(project=project_id, **kwargs)
+
+    import firebase_admin
+    from firebase_admin import credentials
+    from firebase_admin import firestore
+
+    cred = credentials.Certificate(credentials_path)
+    app = firebase_admin.initialize_app(cred, name=app_name) if app_name else firebase_admin.initialize_app(cred)
+    if database_id:
+        return firestore.client(app=app, database_id=database_id)
+    return firestore.client(app=app)
+
+
+class FirestoreSink:
+    # Commits a list of (doc_id, data) operations as one batched write;
+    # data=None deletes the document.
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    def commit(self, ops):
+        batch = self.db.batch()
+        for doc_id, data in ops:
+            ref = self.collection.document(doc_id)
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        batch.commit()
+
+
+class FirestoreSource:
+    # Reads a collection in document-ID order, one page at a time.
+    def __init__(self, db, collection):
+        self.collection = db.collection(collection)
+
+    def iter_range(self, start=None, end=None, after=None, page_size=BATCH_LIMIT):
+        # Yields pages of (doc_id, data) with start <= doc_id < end, resuming
+        # after the `after` ID when given.
+        while True:
+            query = self.collection.order_by('__name__')
+            if after is not None:
+                query = query.start_after({'__name__': after})
+            elif start is not None:
+                query = query.start_at({'__name__': start})
+            if end is not None:
+                query = query.end_before({'__name__': end})
+            page = [(doc.id, doc.to_dict()) for doc in query.limit(page_size).stream()]
+            if not page:
+                return
+            yield page
+            after = page[-1][0]
+
+    def iter_since(self, field, after=None, page_size=BATCH_LIMIT):
+        # Yields pages of (doc_id, data) ordered by `field` and then ID,
+        # starting after the cursor `after`: a (value, doc_id) pair, or just
+        # (value,) to skip every document with that value. Documents without
+        # the field are never returned.
+        while True:
+            query = self.collection.order_by(field).order_by('__name__')
+            if after is not None:
+                query = query.start_after(list(after))
+            page = [(doc.id, doc.to_dict()) for doc in query.limit(page_size).stream()]
+            if not page:
+                return
+            yield page
+            after = (page[-1][1][field], page[-1][0])
+
+
+class MemorySink:
+    # In-process stand-in for FirestoreSink and FirestoreSource. `latency` simulates the commit
+    # round-trip and `failure_rate` the fraction of commits that fail.
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.docs = {}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.commits = 0
+        self.writes = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def commit(self, ops):
+        if len(ops) > BATCH_LIMIT:
+            raise ValueError(f"Batch of {len(ops)} writes exceeds the {BATCH_LIMIT} limit")
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                raise RuntimeError('Simulated commit failure')
+            for doc_id, data in ops:
+                if data is None:
+                    self.docs.pop(doc_id, None)
+                else:
+                    self.docs[doc_id] = data
+            self.commits += 1
+            self.writes += len(ops)
+
+    def iter_range(self, start=None, end=None, after=None, page_size=BATCH_LIMIT):
+        with self.lock:
+            ids = sorted(doc_id for doc_id in self.docs
+                         if (start is None or doc_id >= start) and (end is None or doc_id < end)
+                         and (after is None or doc_id > after))
+        for i in range(0, len(ids), page_size):
+            if self.latency:
+                time.sleep(self.latency)
+            with self.lock:
+                page = [(doc_id, self.docs[doc_id]) for doc_id in ids[i:i + page_size] if doc_id in self.docs]
+            yield page
+
+    def iter_since(self, field, after=None, page_size=BATCH_LIMIT):
+        after = tuple(after) if after is not None else None
+        with self.lock:
+            keys = sorted((data[field], doc_id) for doc_id, data in self.docs.items()
+                          if data.get(field) is not None
+                          and (after is None or (data[field], doc_id)[:len(after)] > after))
+        for i in range(0, len(keys), page_size):
+            if self.latency:
+                time.sleep(self.latency)
+            with self.lock:
+                page = [(doc_id, self.docs[doc_id]) for _, doc_id in keys[i:i + page_size] if doc_id in self.docs]
+            yield page
+
+
+def commit_with_retry(sink, ops, retries=5, base_delay=0.5):
+    for attempt in range(retries + 1):
+        try:
+            sink.commit(ops)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"Batch commit failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def write_batches(sink, batches, max_in_flight=4, retries=5, on_commit=None):
+    # Commits (batch_number, ops) pairs with up to `max_in_flight` batches in
+    # progress. `on_commit(batch_number, ops)` runs on the calling thread.
+    # Returns the batch numbers that still failed after all retries.
+    failed = []
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        def drain(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                batch_number, ops = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Batch {batch_number} failed permanently: {e}")
+                    failed.append(batch_number)
+                    continue
+                if on_commit:
+                    on_commit(batch_number, ops)
+
+        for batch_number, ops in batches:
+            if len(in_flight) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+            future = executor.submit(commit_with_retry, sink, ops, retries)
+            in_flight[future] = (batch_number, ops)
+        while in_flight:
+            drain(FIRST_COMPLETED)
+    return sorted(failed)
+
+
+class BatchCheckpoint:
+    # Remembers how many leading batches are fully committed. Batches finish
+    # out of order, so the saved count only moves over a contiguous prefix.
+    # `source` fingerprints the input: batch numbers only mean the same
+    # documents while it is unchanged.
+    def __init__(self, file_path, batch_size, source=None):
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.source = source
+        self.committed = 0
+        self.done = set()
+        if file_path and os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                state = json.load(f)
+            if state.get('batch_size') != batch_size:
+                print(f"Ignoring {file_path}: it was written with a different batch size")
+            elif state.get('source') != source:
+                print(f"Ignoring {file_path}: the input changed since it was written")
+            else:
+                self.committed = state['committed_batches']
+
+    def mark(self, batch_number):
+        self.done.add(batch_number)
+        while self.committed in self.done:
+            self.done.remove(self.committed)
+            self.committed += 1
+
+    def save(self):
+        if not self.file_path:
+            return
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'batch_size': self.batch_size, 'source': self.source, 'committed_batches': self.committed}, f)
+        os.replace(tmp_path, self.file_path)
+
+    def clear(self):
+        if self.file_path and os.path.exists(self.file_path):
+            os.remove(self.file_path)
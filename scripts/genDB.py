@@ -1,11 +1,24 @@
+import argparse
 import csv
 import json
+import metrics
 import ollama
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
 from tqdm import tqdm
+from journal import Journal, latest_records, read_records, write_records
+from llm_output import ResponseCache, parse_word_entry
+from snapshots import SnapshotStore
+from work_queue import LEASE_SECONDS, RANGE_SIZE, WorkQueue, default_worker_id
 
-def process_word(word, max_attempts=80):
+MODEL = "llama3"
+# generate() placeholder for a repeat of a word that is still in flight
+DUPLICATE = object()
+
+def process_word(word, max_attempts=5, cache=None, client=ollama):
     prompt = f'''Generate a JSON object for the word '{word}'. Strictly adhere to this structure:
 {{
     "word": "{word}",
@@ -23,89 +36,504 @@ Ensure all fields are accurately filled. The "word" field MUST match '{word}' ex
 Use the word in all examples. Provide real synonyms and antonyms.
 Your response MUST be valid JSON. Do not include any text outside the JSON structure.'''
 
-    for attempt in range(max_attempts):
+    started = time.perf_counter()
+    info = {'attempts': 0, 'cache_hit': False, 'repaired': False}
+    if cache is not None:
+        cached = cache.get(MODEL, prompt)
+        if cached is not None:
+            result, repaired, errors = parse_word_entry(cached, word)
+            if result:
+                info.update(cache_hit=True, repaired=repaired)
+                record_word(info, True, started)
+                return result, None, info
+
+    errors = []
+    for _ in range(max_attempts):
+        info['attempts'] += 1
+        request_started = time.perf_counter()
         try:
-            response = ollama.chat(model="llama3", messages=[{"role": "user", "content": prompt}])
-            result = json.loads(response['message']['content'])
-            
-            if result['word'].lower() == word.lower():
-                return result, None
-        except json.JSONDecodeError:
-            continue
+            response = client.chat(model=MODEL, messages=[{"role": "user", "content": prompt}])
+            content = response['message']['content']
         except Exception as e:
-            if attempt == max_attempts - 1:
-                return None, str(e)
+            metrics.record_chat('generate', time.perf_counter() - request_started, error=e)
+            errors = [str(e)]
+            continue
+        metrics.record_chat('generate', time.perf_counter() - request_started, response)
+
+        # Only replies that can't be recovered into a valid entry cost a retry.
+        result, repaired, errors = parse_word_entry(content, word)
+        if result:
+            if cache is not None:
+                cache.put(MODEL, prompt, content)
+            info['repaired'] = repaired
+            record_word(info, True, started)
+            return result, None, info
+        metrics.current.inc('generate_parse_failures_total')
     
-    return None, "Failed to generate valid JSON after maximum attempts"
+    record_word(info, False, started)
+    return None, f"No valid entry after {max_attempts} attempts: {'; '.join(errors)}", info
+
+def record_word(info, ok, started):
+    recorder = metrics.current
+    if not recorder.enabled:
+        return
+    recorder.observe('generate_word_seconds', time.perf_counter() - started)
+    recorder.inc('generate_words_total', result='cached' if info['cache_hit'] else 'ok' if ok else 'failed')
+    recorder.inc('generate_retries_total', max(0, info['attempts'] - 1))
+    recorder.inc('generate_repaired_total', int(info['repaired']))
 
 def load_words(file_path):
+    # A CSV with the word in the first column, or dbprep's JSONL output
+    if file_path.endswith('.jsonl'):
+        return [record['Word'] for record in read_records(file_path)]
     with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
         reader = csv.reader(csvfile)
         return [row[0] for row in reader]
 
 def load_processed_words(file_path):
     if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as jsonfile:
-            return json.load(jsonfile)
+        return list(read_records(file_path))
     return []
 
-def save_results(file_path, data, backup=False):
-    if backup:
-        backup_file = f"{file_path}.bak.{int(time.time())}"
-        with open(backup_file, 'w', encoding='utf-8') as jsonfile:
-            json.dump(data, jsonfile, indent=2)
-        print(f"Backup saved: {backup_file}")
-    
-    with open(file_path, 'w', encoding='utf-8') as jsonfile:
-        json.dump(data, jsonfile, indent=2)
+def word_key(entry):
+    return entry['word'].lower()
+
+def is_deleted(entry):
+    return entry.get('deleted') is True
+
+def output_state_file(journal_file):
+    return f"{journal_file}.outputs.json"
+
+def file_stamp(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def reconcile_output(journal_file, output_file):
+    # The output is edited in place after genDB writes it (improve_quality's
+    # corrections and removals). If it changed since genDB last wrote it, the
+    # edits are appended to the journal, so compaction keeps them: changed or
+    # new entries as later records, removed words as {"word", "deleted"}.
+    if not os.path.exists(output_file) or not os.path.exists(journal_file):
+        return
+    states = {}
+    if os.path.exists(output_state_file(journal_file)):
+        with open(output_state_file(journal_file), 'r') as f:
+            states = json.load(f)
+    state = states.get(os.path.abspath(output_file))
+    if state is not None and state['stamp'] == file_stamp(output_file):
+        return
+    latest = latest_records(journal_file, word_key, is_deleted)
+    if state is not None:
+        written = set(state['words'])
+    elif os.path.getmtime(output_file) > os.path.getmtime(journal_file):
+        # Written before genDB recorded its outputs; it was compacted from the
+        # whole journal
+        written = set(latest)
+    else:
+        written = set()
+
+    changed = removed = 0
+    seen = set()
+    with Journal(journal_file, flush_every=10000) as journal:
+        for entry in load_processed_words(output_file):
+            key = word_key(entry)
+            seen.add(key)
+            if latest.get(key) != entry:
+                journal.append(entry)
+                changed += 1
+        for key in written - seen:
+            if key in latest:
+                journal.append({'word': latest[key]['word'], 'deleted': True})
+                removed += 1
+    if changed or removed:
+        print(f"{output_file} was edited since genDB wrote it: kept {changed} changed entries and "
+              f"{removed} removals in {journal_file}")
+    record_output(journal_file, output_file, seen)
+
+def record_output(journal_file, output_file, words):
+    states = {}
+    state_file = output_state_file(journal_file)
+    if os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            states = json.load(f)
+    states[os.path.abspath(output_file)] = {'stamp': file_stamp(output_file), 'words': sorted(words)}
+    with open(f"{state_file}.tmp", 'w') as f:
+        json.dump(states, f)
+    os.replace(f"{state_file}.tmp", state_file)
+
+def load_journal(journal_file, output_file):
+    # The journal is the source of truth. A run started from an existing
+    # processed_words.json seeds the journal with it once; later edits to the
+    # output are folded back in.
+    if not os.path.exists(journal_file) and os.path.exists(output_file):
+        print(f"Seeding {journal_file} from {output_file}...")
+        with Journal(journal_file, flush_every=10000) as journal:
+            for entry in load_processed_words(output_file):
+                journal.append(entry)
+    reconcile_output(journal_file, output_file)
+    return set(latest_records(journal_file, word_key, is_deleted))
+
+def save_results(journal_file, file_path, snapshot=False, words=None):
+    # `words`: if given, only entries for these lowercased words are written;
+    # the journal keeps the rest for later runs
+    reconcile_output(journal_file, file_path)
+    entries = latest_records(journal_file, word_key, is_deleted)
+    keys = [key for key in entries if words is None or key in words]
+    with metrics.current.timer('checkpoint_seconds', step='compact'):
+        count = write_records(file_path, (entries[key] for key in keys))
+    record_output(journal_file, file_path, keys)
+    if snapshot:
+        # Only entries not already in the store cost space; see snapshots.py
+        with metrics.current.timer('checkpoint_seconds', step='snapshot'):
+            store = SnapshotStore()
+            manifest = store.snapshot_file(file_path, label='genDB')
+            store.close()
+        if manifest.get('unchanged'):
+            print(f"No changes since snapshot {manifest['id']}")
+        else:
+            print(f"Snapshot {manifest['id']} saved ({manifest['new_objects']} new objects)")
+    return count
 
 def save_progress(file_path, index):
     with open(file_path, 'w') as f:
         f.write(str(index))
 
+def generate(all_words, start_index, processed_set, workers, on_result, process=process_word):
+    # Keep up to `workers` requests in flight, but hand results to `on_result`
+    # strictly in input order so progress never skips an unfinished word.
+    # A repeat of a word that is still in flight waits for its twin: it is
+    # skipped if the twin succeeds and generated itself if the twin fails.
+    max_buffered = workers * 4
+    pending = {}
+    scheduled = set()
+    next_submit = start_index
+    next_commit = start_index
+
+    def running():
+        return [f for f in pending.values() if f not in (None, DUPLICATE) and not f.done()]
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while next_commit < len(all_words):
+            in_flight = len(running())
+            while (next_submit < len(all_words) and in_flight < workers
+                   and len(pending) < max_buffered):
+                key = all_words[next_submit].lower()
+                if key in processed_set:
+                    pending[next_submit] = None
+                elif key in scheduled:
+                    pending[next_submit] = DUPLICATE
+                else:
+                    scheduled.add(key)
+                    pending[next_submit] = executor.submit(process, all_words[next_submit])
+                    in_flight += 1
+                next_submit += 1
+
+            head = pending[next_commit]
+            if head not in (None, DUPLICATE) and not head.done():
+                wait(running(), return_when=FIRST_COMPLETED)
+
+            while next_commit in pending:
+                future = pending[next_commit]
+                word = all_words[next_commit]
+                if future is DUPLICATE:
+                    # Everything before this word is committed, so its twin is done
+                    if word.lower() in scheduled:
+                        future = None
+                    else:
+                        scheduled.add(word.lower())
+                        pending[next_commit] = executor.submit(process, word)
+                        break
+                if future is not None and not future.done():
+                    break
+                del pending[next_commit]
+                if future is None:
+                    result, error, info = None, None, None
+                else:
+                    result, error, info = future.result()
+                    if not result:
+                        scheduled.discard(word.lower())
+                on_result(next_commit, word, result, error, info)
+                next_commit += 1
+    finally:
+        # Don't block on in-flight requests here; the caller saves first and the
+        # interpreter joins the remaining worker threads on exit.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def queue_worker(queue_file, worker, process, lease_seconds, stop):
+    # Leases ranges and reports their entries until the whole queue is done.
+    # While other workers still hold leases it keeps polling, so a range whose
+    # worker died is picked up here once its lease expires.
+    queue = WorkQueue(queue_file, lease_seconds)
+    try:
+        while not stop.is_set():
+            leased = queue.lease(worker)
+            if leased is None:
+                if queue.finished():
+                    return
+                stop.wait(min(5, lease_seconds / 4))
+                continue
+
+            range_id, words = leased
+            metrics.current.inc('queue_ranges_total', event='leased')
+            results = []
+            failures = []
+            renewed = time.time()
+            lost = False
+            for position, word in words:
+                if stop.is_set():
+                    queue.release(range_id, worker)
+                    return
+                result, error, info = process(word)
+                if result:
+                    results.append((position, result))
+                else:
+                    failures.append((position, word, error))
+                if time.time() - renewed > lease_seconds / 3:
+                    if not queue.renew(range_id, worker):
+                        # Someone else has the range now and will finish it
+                        print(f"Lost the lease on range {range_id}; leaving it to its new worker")
+                        metrics.current.inc('queue_ranges_total', event='lost')
+                        lost = True
+                        break
+                    renewed = time.time()
+            if not lost:
+                queue.complete(range_id, worker, results, failures)
+                metrics.current.inc('queue_ranges_total', event='completed')
+    finally:
+        queue.close()
+
+def start_queue_workers(args, cache, stop):
+    # `--workers` threads per model endpoint, each leasing its own ranges, so
+    # every endpoint (or extra host) adds its share of throughput.
+    base_id = args.worker_id or default_worker_id()
+    threads = []
+    for endpoint in args.endpoints:
+        client = ollama.Client(host=endpoint) if endpoint else ollama
+        process = partial(process_word, max_attempts=args.max_attempts, cache=cache, client=client)
+        for slot in range(max(1, args.workers)):
+            worker = f"{base_id}@{endpoint or 'default'}#{slot}"
+            thread = threading.Thread(target=queue_worker, daemon=True,
+                                      args=(args.queue, worker, process, args.lease_seconds, stop))
+            thread.start()
+            threads.append(thread)
+    return threads
+
+def merge_queue_results(queue, journal, processed_set):
+    # Moves finished entries from the queue into the journal. The journal is
+    # fsynced before they are marked merged, so a crash can only repeat a
+    # merge, and the journal's readers keep the first entry per word.
+    keys = []
+    for key, entry in queue.unmerged():
+        if key not in processed_set:
+            journal.append(entry)
+            processed_set.add(key)
+        keys.append(key)
+    journal.flush()
+    queue.mark_merged(keys)
+    return len(keys)
+
+def run_queue(args, journal_file, output_file):
+    # Coordinator (default): fills the queue from --input, works on it through
+    # --endpoints and merges results into the journal until every range is
+    # done. With --worker it only works, so other hosts can join a run.
+    queue = WorkQueue(args.queue, args.lease_seconds)
+    cache = None if args.no_cache else ResponseCache('llm_cache.sqlite')
+    stop = threading.Event()
+    journal = None
+    processed_set = set()
+
+    if args.worker:
+        if queue.get_meta('source') is None:
+            print(f"{args.queue} has no work yet; start the coordinator first")
+            return
+    else:
+        processed_set = load_journal(journal_file, output_file)
+        journal = Journal(journal_file)
+        merge_queue_results(queue, journal, processed_set)
+        if queue.finished():
+            ranges = queue.fill(load_words(args.input), args.range_size, processed_set,
+                                source=os.path.abspath(args.input))
+            print(f"Queued {ranges} ranges of up to {args.range_size} words from {args.input}")
+        else:
+            print(f"Resuming {args.queue} ({queue.get_meta('source')})")
+
+    threads = start_queue_workers(args, cache, stop)
+    print(f"{len(threads)} local workers over {len(args.endpoints)} endpoints")
+    counts = queue.counts()
+    total = sum(counts[status] for status in ('pending', 'leased', 'expired', 'done'))
+    progress_bar = tqdm(total=total, initial=counts['done'], unit='range')
+    try:
+        while True:
+            alive = any(thread.is_alive() for thread in threads)
+            if journal is not None:
+                with metrics.current.timer('checkpoint_seconds', step='merge'):
+                    merge_queue_results(queue, journal, processed_set)
+            progress_bar.update(queue.counts()['done'] - progress_bar.n)
+            if not alive and (args.worker or queue.finished()):
+                break
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        print("\nInterrupted. Handing unfinished ranges back to the queue...")
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    finally:
+        progress_bar.close()
+        if journal is not None:
+            merge_queue_results(queue, journal, processed_set)
+            journal.close()
+        if cache is not None:
+            cache.close()
+        counts = queue.counts()
+        print(f"Queue: {counts['done']}/{total} ranges done, {counts['results']} words generated, "
+              f"{counts['failures']} failed")
+        for worker, count in queue.workers().items():
+            print(f"  {worker}: {count}")
+        queue.close()
+        if journal is not None:
+            words = {word.lower() for word in load_words(args.input)} if args.only_input else None
+            count = save_results(journal_file, output_file, snapshot=True, words=words)
+            print(f"Processed {count} words. Results saved to {output_file}")
+
 def main():
-    input_file = 'final_scrape.csv'
-    output_file = 'processed_words.json'
+    parser = argparse.ArgumentParser(description='Generate word entries with the local model.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of concurrent model requests (default: 4)')
+    parser.add_argument('--max-attempts', type=int, default=5,
+                        help='Model calls allowed per word before giving up (default: 5)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the on-disk response cache')
+    parser.add_argument('--compact', action='store_true',
+                        help='Only rebuild the output file from the journal and exit')
+    parser.add_argument('--input', default='final_scrape.csv',
+                        help='Word list: a CSV with the word first, or dbprep JSONL')
+    parser.add_argument('--output', default='processed_words.json',
+                        help='Written as JSON Lines if the name ends in .jsonl')
+    parser.add_argument('--restart', action='store_true',
+                        help='Walk the whole word list again; words already in the journal are skipped')
+    parser.add_argument('--only-input', action='store_true',
+                        help='Write only the words in --input, not every word the journal holds from earlier runs')
+    parser.add_argument('--queue', help='Share the run through this work queue (see work_queue.py)')
+    parser.add_argument('--worker', action='store_true',
+                        help='With --queue: only work on an existing queue, e.g. from another host')
+    parser.add_argument('--endpoints', nargs='*', default=[None],
+                        help='With --queue: model servers to spread work over, e.g. http://gpu1:11434 '
+                             '(default: OLLAMA_HOST; none: only coordinate). --workers is per endpoint')
+    parser.add_argument('--range-size', type=int, default=RANGE_SIZE,
+                        help='With --queue: words per leased range')
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS,
+                        help='With --queue: how long a silent worker keeps its range')
+    parser.add_argument('--worker-id', help='With --queue: name of this worker (default: host-pid)')
+    parser.add_argument('--metrics-dir',
+                        help='Export latency histograms and counters to genDB.prom and genDB.json here')
+    parser.add_argument('--metrics-interval', type=float, default=15,
+                        help='Seconds between metrics exports (default: 15)')
+    args = parser.parse_args()
+
+    input_file = args.input
+    output_file = args.output
+    journal_file = 'processed_words.jsonl'
     progress_file = 'progress.txt'
+    cache_file = 'llm_cache.sqlite'
+    stats_file = 'generation_stats.jsonl'
+    if os.path.abspath(output_file) == os.path.abspath(journal_file):
+        parser.error(f"--output can't be the journal file {journal_file}")
+
+    if args.compact:
+        words = {word.lower() for word in load_words(input_file)} if args.only_input else None
+        count = save_results(journal_file, output_file, words=words)
+        print(f"Compacted {count} words from {journal_file} into {output_file}")
+        return
+
+    if args.metrics_dir:
+        metrics.enable('genDB', args.metrics_dir, args.metrics_interval)
+
+    if args.queue:
+        try:
+            run_queue(args, journal_file, output_file)
+        finally:
+            metrics.current.stop()
+        return
     
     all_words = load_words(input_file)
-    processed_words = load_processed_words(output_file)
-    processed_set = set(word['word'].lower() for word in processed_words)
+    processed_set = load_journal(journal_file, output_file)
     
     start_index = 0
-    if os.path.exists(progress_file):
+    if os.path.exists(progress_file) and not args.restart:
         with open(progress_file, 'r') as f:
             start_index = int(f.read().strip())
     
     print(f"Total words: {len(all_words)}")
     print(f"Processed words: {len(processed_set)}")
     print(f"Starting from index: {start_index}")
+    print(f"Concurrent requests: {args.workers}")
     
+    cache = None if args.no_cache else ResponseCache(cache_file)
+    process = partial(process_word, max_attempts=args.max_attempts, cache=cache)
+    journal = Journal(journal_file)
+    stats_journal = Journal(stats_file)
+    totals = {'words': 0, 'model_calls': 0, 'retried': 0, 'cache_hits': 0, 'repaired': 0, 'failed': 0}
+    progress_bar = tqdm(initial=start_index, total=len(all_words))
+    committed = start_index
+
+    def checkpoint():
+        # Progress only moves once everything before it is fsynced.
+        with metrics.current.timer('checkpoint_seconds', step='journal_flush'):
+            journal.flush()
+            stats_journal.flush()
+            save_progress(progress_file, committed)
+
+    def on_result(i, word, result, error, info):
+        nonlocal committed
+        if info is not None:
+            # Per-word retry counts, so cache and repair savings can be measured.
+            stats_journal.append({'word': word, 'ok': bool(result), **info})
+            totals['words'] += 1
+            totals['model_calls'] += info['attempts']
+            totals['retried'] += info['attempts'] > 1
+            totals['cache_hits'] += info['cache_hit']
+            totals['repaired'] += info['repaired']
+            totals['failed'] += not result
+        if result and not error:
+            if result['word'].lower() not in processed_set:
+                journal.append(result)
+                processed_set.add(result['word'].lower())
+        elif error:
+            print(f"Failed to process '{word}': {error}")
+        
+        committed = i + 1
+        progress_bar.update(1)
+        
+        if (i + 1) % 100 == 0:
+            checkpoint()
+
     try:
-        for i in tqdm(range(start_index, len(all_words)), initial=start_index, total=len(all_words)):
-            word = all_words[i]
-            if word.lower() not in processed_set:
-                result, error = process_word(word)
-                if result and not error:
-                    processed_words.append(result)
-                    processed_set.add(result['word'].lower())
-                else:
-                    print(f"Failed to process '{word}': {error}")
-            
-            save_progress(progress_file, i + 1)
-            
-            if (i + 1) % 1000 == 0:
-                save_results(output_file, processed_words, backup=True)
-            elif (i + 1) % 100 == 0:
-                save_results(output_file, processed_words)
+        generate(all_words, start_index, processed_set, max(1, args.workers), on_result, process)
     
     except KeyboardInterrupt:
         print("\nProcess interrupted. Saving progress...")
     
     finally:
-        save_results(output_file, processed_words, backup=True)
-        print(f"Processed {len(processed_words)} words. Results saved to {output_file}")
+        progress_bar.close()
+        checkpoint()
+        journal.close()
+        stats_journal.close()
+        if cache is not None:
+            cache.close()
+        words = {word.lower() for word in all_words} if args.only_input else None
+        count = save_results(journal_file, output_file, snapshot=True, words=words)
+        print(f"Processed {count} words. Results saved to {output_file}")
         print(f"Remaining words: {len(all_words) - len(processed_set)}")
+        print(f"Generated {totals['words']} words with {totals['model_calls']} model calls: "
+              f"{totals['cache_hits']} cache hits, {totals['retried']} retried, "
+              f"{totals['repaired']} repaired, {totals['failed']} failed. "
+              f"Per-word counts in {stats_file}")
+        metrics.current.stop()
+        if args.metrics_dir:
+            print(f"Metrics written to {args.metrics_dir}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
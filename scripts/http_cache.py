@@ -0,0 +1,95 @@
+import argparse
+import csv
+import json
+import sqlite3
+import time
+
+DAY = 24 * 60 * 60
+
+
+class ScrapeCache:
+    # Raw dictionary API responses keyed by word. 200s are kept for `ttl`
+    # seconds and 404s for `negative_ttl` (None means forever), so a re-scrape
+    # only touches the network for missing or expired words.
+    def __init__(self, file_path, ttl=None, negative_ttl=30 * DAY, commit_every=100):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.conn = sqlite3.connect(file_path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+            word TEXT PRIMARY KEY,
+            status INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            fetched_at REAL NOT NULL)''')
+        self.conn.commit()
+
+    def is_fresh(self, status, fetched_at, now=None):
+        ttl = self.ttl if status == 200 else self.negative_ttl
+        return ttl is None or (now or time.time()) - fetched_at < ttl
+
+    def get(self, word):
+        row = self.conn.execute(
+            'SELECT status, body, fetched_at FROM responses WHERE word = ?', (word,)).fetchone()
+        if row and self.is_fresh(row[0], row[2]):
+            return row[0], row[1]
+        return None
+
+    def put(self, word, status, body):
+        self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                          (word, status, body, time.time()))
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def iter_entries(self, status=200):
+        # Streams (word, parsed body) pairs for downstream stages.
+        query = self.conn.execute(
+            'SELECT word, body FROM responses WHERE status = ? ORDER BY rowid', (status,))
+        for word, body in query:
+            yield word, json.loads(body)
+
+    def stats(self):
+        now = time.time()
+        counts = {}
+        for status, fetched_at in self.conn.execute('SELECT status, fetched_at FROM responses'):
+            key = (status, 'fresh' if self.is_fresh(status, fetched_at, now) else 'expired')
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or export the dictionary scrape cache.')
+    parser.add_argument('--cache', default='scrape_cache.sqlite')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Count cached responses by status and freshness')
+    export = subparsers.add_parser('export', help='Write cached 200 responses as a scrape CSV')
+    export.add_argument('--output', default='final_scrape_pending.csv')
+    args = parser.parse_args()
+
+    cache = ScrapeCache(args.cache)
+    if args.command == 'stats':
+        for (status, freshness), count in sorted(cache.stats().items()):
+            print(f"{status} {freshness}: {count}")
+    elif args.command == 'export':
+        count = 0
+        with open(args.output, 'w', newline='') as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(['Word', 'WordInfo'])
+            for word, wordInfo in cache.iter_entries():
+                writer.writerow([word, json.dumps(wordInfo)])
+                count += 1
+        print(f"Exported {count} words to {args.output}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,16 @@
-import json
+import argparse
 import os
+import time
 from tqdm import tqdm
+import metrics
 import ollama
 import re
+from entry_checks import CONTRACTIONS, MIN_CONFIDENCE, check_entries, flagged_indexes, summarize
+from journal import Journal, read_journal, read_records, write_records
+from llm_output import ResponseCache, extract_json
+from word_store import WordStore
 
-CONTRACTIONS = {
-    "'ve": "have",
-    "'s": "is",
-    "'m": "am",
-    "'re": "are",
-    "'ll": "will",
-    "'d": "would",
-    "n't": "not"
-}
+MODEL = "llama3"
 
 def is_valid_word(word):
     valid_short_words = ['a', 'i', 'I'] + list(CONTRACTIONS.keys())
@@ -29,42 +27,171 @@ def is_valid_word(word):
     
     return True
 
-def verify_entry_with_ai(entry):
+REQUIREMENTS = '''Requirements:
+1. The definition MUST accurately describe the word or contraction.
+2. For contractions, explain its usage and provide the full form.
+3. The definition should be clear, accurate, and comprehensive.
+4. Examples should correctly use the word in context.
+5. Only suggest changes if they significantly improve the entry.'''
+
+def verification_prompt(entry):
     word = entry['word']
     is_contraction = word in CONTRACTIONS
     full_form = CONTRACTIONS.get(word, word)
+    # Entries with fewer than three examples get empty slots for the model to fill
+    examples = (list(entry.get('examples') or []) + ['', '', ''])[:3]
     
     prompt = f'''Verify and improve the quality of the following word entry:
 
 Word: {word}
 {'This is a contraction of: ' + full_form if is_contraction else ''}
-Definition: {entry['definition']}
+Definition: {entry.get('definition', '')}
 Examples:
-1. {entry['examples'][0]}
-2. {entry['examples'][1]}
-3. {entry['examples'][2]}
+1. {examples[0]}
+2. {examples[1]}
+3. {examples[2]}
 
-Requirements:
-1. The definition MUST accurately describe the word or contraction.
-2. For contractions, explain its usage and provide the full form.
-3. The definition should be clear, accurate, and comprehensive.
-4. Examples should correctly use the word in context.
-5. Only suggest changes if they significantly improve the entry.
+{REQUIREMENTS}
 
 If the entry meets all requirements and is high quality, respond with "PASS". Otherwise, respond with "FAIL" followed by a corrected version of the entry in the same format as above. Your response should be either "PASS" or "FAIL: [corrected entry]".'''
+    return prompt
+
+def cached_reply(entry, cache):
+    # The prompt is built only from the entry, so an unchanged entry is a
+    # cache hit and re-verifying a corpus only costs model calls for edits.
+    if cache is None:
+        return None
+    return cache.get(MODEL, verification_prompt(entry))
+
+def verify_entry_with_ai(entry, cache=None, client=ollama):
+    cached = cached_reply(entry, cache)
+    if cached is not None:
+        metrics.current.inc('verify_cache_hits_total')
+        return cached
+
+    prompt = verification_prompt(entry)
+    started = time.perf_counter()
+    try:
+        response = client.chat(model=MODEL, messages=[{"role": "user", "content": prompt}])
+    except Exception as e:
+        metrics.record_chat('verify', time.perf_counter() - started, error=e)
+        raise
+    metrics.record_chat('verify', time.perf_counter() - started, response)
+    content = response['message']['content'].strip()
+    if cache is not None:
+        cache.put(MODEL, prompt, content)
+    return content
+
+def batch_prompt(entries):
+    blocks = []
+    for number, entry in enumerate(entries, 1):
+        word = entry['word']
+        lines = [f"Entry {number}", f"Word: {word}"]
+        if word in CONTRACTIONS:
+            lines.append(f"This is a contraction of: {CONTRACTIONS[word]}")
+        lines.append(f"Definition: {entry.get('definition', '')}")
+        lines.append("Examples:")
+        lines.extend(f"{i}. {example}" for i, example in enumerate((entry.get('examples') or [])[:3], 1))
+        blocks.append('\n'.join(lines))
+    entries_text = '\n\n'.join(blocks)
+
+    return f'''Verify and improve the quality of each of the following {len(entries)} word entries:
+
+{entries_text}
+
+{REQUIREMENTS}
+
+Respond with only a JSON array with one object per entry, in the same order:
+[{{"word": "<word>", "result": "PASS"}}, {{"word": "<word>", "result": "FAIL", "definition": "<corrected definition>", "examples": ["<example 1>", "<example 2>", "<example 3>"]}}]
+Use "PASS" when an entry meets all requirements and is high quality, otherwise "FAIL" with the corrected definition and examples.'''
 
-    response = ollama.chat(model="llama3", messages=[{"role": "user", "content": prompt}])
-    return response['message']['content'].strip()
+def batch_item_reply(item, entry):
+    # Turns one object of a batched reply into the reply the single-entry
+    # prompt would have produced, or None if it is unusable.
+    if not isinstance(item, dict):
+        return None
+    result = str(item.get('result', '')).strip().upper()
+    if result.startswith('PASS'):
+        return 'PASS'
+    if not result.startswith('FAIL') or not isinstance(item.get('definition'), str):
+        return None
+    examples = item.get('examples')
+    if not isinstance(examples, list) or not all(isinstance(example, str) for example in examples):
+        examples = entry.get('examples') or []
+    lines = [f"Word: {entry['word']}", f"Definition: {item['definition']}", "Examples:"]
+    lines.extend(f"{i}. {example}" for i, example in enumerate(examples[:3], 1))
+    return 'FAIL: ' + '\n'.join(lines)
+
+def verify_entries_with_ai(entries, cache=None, client=ollama):
+    # Verifies several entries with one prompt. Returns {lowercased word:
+    # reply} in the single-entry reply format for every entry whose result
+    # could be parsed; each is also cached under the entry's own prompt.
+    started = time.perf_counter()
+    try:
+        response = client.chat(model=MODEL, messages=[{"role": "user", "content": batch_prompt(entries)}])
+    except Exception as e:
+        metrics.record_chat('verify_batch', time.perf_counter() - started, error=e)
+        raise
+    metrics.record_chat('verify_batch', time.perf_counter() - started, response)
+    items, _ = extract_json(response['message']['content'], opening='[')
+    by_word = {}
+    for item in items or []:
+        if isinstance(item, dict) and isinstance(item.get('word'), str):
+            by_word.setdefault(item['word'].strip().lower(), item)
+
+    replies = {}
+    for entry in entries:
+        reply = batch_item_reply(by_word.get(entry['word'].lower()), entry)
+        if reply is not None:
+            replies[entry['word'].lower()] = reply
+            if cache is not None:
+                cache.put(MODEL, verification_prompt(entry), reply)
+    metrics.current.inc('verify_batch_entries_total', len(entries))
+    metrics.current.inc('verify_batch_fallbacks_total', len(entries) - len(replies))
+    return replies
+
+class PromptSizer:
+    # Adapts the number of entries per prompt. Keeps stepping the size in the
+    # same direction while the time per entry improves and turns around when
+    # it gets worse; halves it when the smoothed share of entries that need a
+    # single-entry retry goes over `max_failure_rate`.
+    def __init__(self, size=8, max_size=32, max_failure_rate=0.2):
+        self.size = size
+        self.max_size = max_size
+        self.max_failure_rate = max_failure_rate
+        self.step = 1
+        self.failure_rate = 0.0
+        self.last_per_entry = None
+        self.prompts = 0
+        self.entries = 0
+        self.fallbacks = 0
+
+    def record(self, entries, fallbacks, seconds):
+        self.prompts += 1
+        self.entries += entries
+        self.fallbacks += fallbacks
+        # Retried entries cost a call each on top of the batched prompt
+        per_entry = seconds / (entries - fallbacks) if fallbacks < entries else float('inf')
+        self.failure_rate = 0.8 * self.failure_rate + 0.2 * fallbacks / entries
+        if self.failure_rate > self.max_failure_rate:
+            self.size = max(2, self.size // 2)
+            self.failure_rate = self.max_failure_rate / 2
+            self.step = 1
+            self.last_per_entry = None
+            return
+        if self.last_per_entry is not None and per_entry > self.last_per_entry * 1.05:
+            self.step = -self.step
+        self.last_per_entry = per_entry
+        self.size = min(self.max_size, max(2, self.size + self.step))
 
 def load_processed_words(file_path):
     if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as jsonfile:
-            return json.load(jsonfile)
+        return list(read_records(file_path))
     return []
 
 def save_processed_words(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as jsonfile:
-        json.dump(data, jsonfile, indent=2, ensure_ascii=False)
+    with metrics.current.timer('checkpoint_seconds', step='save'):
+        write_records(file_path, data, ensure_ascii=False)
 
 def parse_corrected_entry(correction, original_entry):
     try:
@@ -72,18 +199,19 @@ def parse_corrected_entry(correction, original_entry):
         definition_match = re.search(r'Definition:\s*(.*)', correction)
         examples_match = re.findall(r'\d\.\s*(.*)', correction)
 
+        original_examples = original_entry.get('examples') or []
         word = word_match.group(1) if word_match else original_entry['word']
-        definition = definition_match.group(1) if definition_match else original_entry['definition']
-        examples = examples_match if examples_match else original_entry['examples']
+        definition = definition_match.group(1) if definition_match else original_entry.get('definition', '')
+        examples = examples_match if examples_match else list(original_examples)
 
-        while len(examples) < 3:
-            examples.append(original_entry['examples'][len(examples)])
+        while len(examples) < 3 and len(examples) < len(original_examples):
+            examples.append(original_examples[len(examples)])
         examples = examples[:3]
 
         # For contractions, we don't require the contraction itself to be in the definition
         if word not in CONTRACTIONS and word.lower() not in definition.lower():
             print(f"Warning: Definition for '{word}' does not include the word itself. Keeping original definition.")
-            definition = original_entry['definition']
+            definition = original_entry.get('definition', '')
 
         return {'word': word, 'definition': definition, 'examples': examples}
     except Exception as e:
@@ -91,61 +219,201 @@ def parse_corrected_entry(correction, original_entry):
         print(f"Original correction text: {correction}")
         return original_entry
 
-def process_batch(batch):
-    updated = False
-    words_to_remove = []
-    
-    for entry in batch:
+def process_batch(batch, cache=None, client=ollama, sizer=None, flagged=None):
+    # `batch` is a list of (index, entry) pairs. Returns the edits to record
+    # instead of mutating the corpus, so removals never shift positions.
+    # With a `sizer`, uncached entries are verified with one prompt and only
+    # those whose result can't be parsed get their own call. With `flagged`,
+    # only those indexes go to the model; the rest passed entry_checks.
+    edits = []
+    valid = []
+
+    for index, entry in batch:
         if not is_valid_word(entry['word']):
             print(f"Removing invalid word: '{entry['word']}'")
-            words_to_remove.append(entry)
-            updated = True
-            continue
+            edits.append({'index': index, 'action': 'remove', 'word': entry['word']})
+            metrics.current.inc('verify_results_total', result='removed')
+        elif flagged is not None and index not in flagged:
+            metrics.current.inc('verify_results_total', result='prechecked')
+        else:
+            valid.append((index, entry))
 
+    replies = {}
+    if sizer is not None:
+        pending = []
+        for _, entry in valid:
+            try:
+                if cached_reply(entry, cache) is None:
+                    pending.append(entry)
+            except Exception:
+                pass  # reported by the single-entry path below
+        if len(pending) > 1:
+            start = time.perf_counter()
+            try:
+                replies = verify_entries_with_ai(pending, cache, client)
+            except Exception as e:
+                print(f"Batched verification failed: {e}")
+            sizer.record(len(pending), len(pending) - len(replies), time.perf_counter() - start)
+
+    for index, entry in valid:
         try:
-            result = verify_entry_with_ai(entry)
+            result = replies.get(entry['word'].lower()) or verify_entry_with_ai(entry, cache, client)
+            metrics.current.inc('verify_results_total', result='fail' if result.startswith("FAIL") else 'pass')
             if result.startswith("FAIL"):
                 corrected_entry = parse_corrected_entry(result.split(': ', 1)[1], entry)
-                if corrected_entry != entry:
+                updated_entry = {**entry, **corrected_entry}
+                if updated_entry != entry:
                     print(f"\nUpdating entry for word '{entry['word']}':")
-                    print(f"  Old definition: {entry['definition']}")
+                    print(f"  Old definition: {entry.get('definition')}")
                     print(f"  New definition: {corrected_entry['definition']}")
-                    print(f"  Old examples: {entry['examples']}")
+                    print(f"  Old examples: {entry.get('examples')}")
                     print(f"  New examples: {corrected_entry['examples']}")
                     
-                    entry.update(corrected_entry)
-                    updated = True
+                    edits.append({'index': index, 'action': 'update', 'entry': updated_entry})
         except Exception as e:
             print(f"Error processing entry for '{entry['word']}': {e}")
+            metrics.current.inc('verify_results_total', result='error')
     
-    for word in words_to_remove:
-        batch.remove(word)
-    
-    return updated, words_to_remove
+    return edits
+
+def source_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def load_edits(journal_file, fingerprint):
+    # Replays the edit journal into (position, removed indices, updated entries).
+    # A journal written against a different version of the corpus is set aside.
+    position = 0
+    removed = set()
+    updates = {}
+    records = read_journal(journal_file)
+    header = next(records, None)
+    if header is None:
+        return position, removed, updates
+    if header.get('source') != fingerprint:
+        stale_file = f"{journal_file}.stale"
+        os.replace(journal_file, stale_file)
+        print(f"{journal_file} was written for a different corpus; moved it to {stale_file}")
+        return position, removed, updates
+
+    for record in records:
+        if 'checkpoint' in record:
+            position = record['checkpoint']
+        elif record['action'] == 'remove':
+            removed.add(record['index'])
+            updates.pop(record['index'], None)
+        elif record['action'] == 'update':
+            updates[record['index']] = record['entry']
+    return position, removed, updates
+
+def apply_edits(processed_words, removed, updates):
+    for index, entry in enumerate(processed_words):
+        if index not in removed:
+            yield updates.get(index, entry)
+
+def apply_edits_to_store(file_path, processed_words, removed, updates):
+    # In-place edits of a word store: only the changed rows are written.
+    with WordStore(file_path) as store:
+        for index in removed:
+            store.delete(processed_words[index]['word'])
+        for index, entry in updates.items():
+            if entry['word'].lower() != processed_words[index]['word'].lower():
+                store.delete(processed_words[index]['word'])
+            store.put(entry)
 
 def main():
-    input_file = 'processed_words.json'
+    parser = argparse.ArgumentParser(description='Verify word entries with the local model.')
+    parser.add_argument('--input', default='processed_words.json')
+    parser.add_argument('--output', default=None,
+                        help='Defaults to rewriting the input file (a .sqlite word store is edited in place)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the on-disk response cache')
+    parser.add_argument('--per-prompt', type=int, default=8,
+                        help='Initial entries verified per prompt, adapted as it runs (1 = one call per entry)')
+    parser.add_argument('--max-per-prompt', type=int, default=32)
+    parser.add_argument('--host', help='Ollama server, e.g. http://gpu-box:11434 (default: OLLAMA_HOST)')
+    parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE,
+                        help='Entries entry_checks scores at or above this skip the model (default: %(default)s)')
+    parser.add_argument('--check-all', action='store_true',
+                        help='Send every entry to the model, not only those entry_checks flags')
+    parser.add_argument('--metrics-dir',
+                        help='Export latency histograms and counters to improve_quality.prom and .json here')
+    parser.add_argument('--metrics-interval', type=float, default=15,
+                        help='Seconds between metrics exports (default: 15)')
+    args = parser.parse_args()
+    if args.metrics_dir:
+        metrics.enable('improve_quality', args.metrics_dir, args.metrics_interval)
+
+    input_file = args.input
+    output_file = args.output or input_file
+    journal_file = 'verify_edits.jsonl'
+    cache = None if args.no_cache else ResponseCache('llm_cache.sqlite')
+    client = ollama.Client(host=args.host) if args.host else ollama
+    sizer = PromptSizer(args.per_prompt, args.max_per_prompt) if args.per_prompt > 1 else None
     processed_words = load_processed_words(input_file)
+    fingerprint = source_fingerprint(input_file)
+
+    position, removed, updates = load_edits(journal_file, fingerprint)
+    if not os.path.exists(journal_file) or os.path.getsize(journal_file) == 0:
+        with Journal(journal_file) as journal:
+            journal.append({'source': fingerprint})
 
     print(f"Total words to verify: {len(processed_words)}")
+    flagged = None
+    if not args.check_all:
+        checks = check_entries(processed_words)
+        flagged = flagged_indexes(checks, args.min_confidence)
+        _, issue_counts = summarize(checks, args.min_confidence)
+        print(f"{len(flagged)} entries flagged by entry_checks go to the model; the other "
+              f"{len(processed_words) - len(flagged)} passed. Issues: {dict(issue_counts.most_common())}")
+    if position:
+        print(f"Resuming from entry {position} ({len(updates)} updated, {len(removed)} removed so far)")
 
     batch_size = 10
-    removed_words = []
+    i = position
     
-    for i in tqdm(range(0, len(processed_words), batch_size), desc="Processing batches"):
-        batch = processed_words[i:i+batch_size]
-        updated, removed = process_batch(batch)
-        removed_words.extend(removed)
-        
-        if updated:
-            save_processed_words(input_file, processed_words)
-            print(f"\nUpdated information saved to {input_file} (words {i+1}-{min(i+batch_size, len(processed_words))})")
-
-    for word in removed_words:
-        processed_words.remove(word)
-
-    save_processed_words(input_file, processed_words)
-    print(f"\nFinal update: Removed {len(removed_words)} invalid words.")
+    with Journal(journal_file) as journal, tqdm(total=len(processed_words), initial=position, desc="Verifying") as progress:
+        while i < len(processed_words):
+            # With batched prompts, each checkpoint covers one prompt's worth
+            # of flagged entries
+            wanted = sizer.size if sizer else batch_size
+            end = i
+            while end < len(processed_words) and wanted > 0:
+                wanted -= flagged is None or end in flagged
+                end += 1
+            batch = [(index, updates.get(index, processed_words[index])) for index in range(i, end)]
+            edits = process_batch(batch, cache, client, sizer, flagged)
+            
+            # Only the changed entries are persisted; the checkpoint marks the
+            # batch as verified once its edits are durable.
+            for edit in edits:
+                journal.append(edit)
+                if edit['action'] == 'remove':
+                    removed.add(edit['index'])
+                else:
+                    updates[edit['index']] = edit['entry']
+            journal.append({'checkpoint': end})
+            with metrics.current.timer('checkpoint_seconds', step='journal_flush'):
+                journal.flush()
+
+            if edits:
+                print(f"\nRecorded {len(edits)} edits to {journal_file} (words {i+1}-{end})")
+            progress.update(end - i)
+            i = end
+
+    if cache is not None:
+        cache.close()
+    if output_file == input_file and input_file.endswith('.sqlite'):
+        with metrics.current.timer('checkpoint_seconds', step='store_update'):
+            apply_edits_to_store(input_file, processed_words, removed, updates)
+    elif updates or removed or output_file != input_file:
+        save_processed_words(output_file, apply_edits(processed_words, removed, updates))
+    os.remove(journal_file)
+    print(f"\nFinal update: Updated {len(updates)} entries and removed {len(removed)} invalid words.")
+    if sizer is not None and sizer.prompts:
+        print(f"Batched {sizer.entries} entries into {sizer.prompts} prompts; {sizer.fallbacks} needed a "
+              f"single-entry retry. Entries per prompt ended at {sizer.size}.")
+    metrics.current.stop()
     print("\nVerification complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import json
+import os
+
+
+class Journal:
+    # Append-only JSONL log. Records are buffered by the OS and made durable
+    # with a single fsync per `flush_every` appends instead of one per record.
+    def __init__(self, file_path, flush_every=100):
+        self.file_path = file_path
+        self.flush_every = flush_every
+        self.pending = 0
+        self._file = open(file_path, 'a', encoding='utf-8')
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_journal(file_path):
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a torn final line; everything
+                # before it is still valid.
+                print(f"Skipping unreadable journal line {line_number} in {file_path}")
+
+
+def write_json_array(file_path, records, indent=2, ensure_ascii=True):
+    # Streams `records` into the same layout json.dump(list, indent=indent)
+    # produces, writing to a temporary file that replaces `file_path` at the end.
+    tmp_path = f"{file_path}.tmp"
+    count = 0
+    prefix = ' ' * indent
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for record in records:
+            text = json.dumps(record, indent=indent, ensure_ascii=ensure_ascii)
+            out.write('[\n' if count == 0 else ',\n')
+            out.write('\n'.join(prefix + line for line in text.split('\n')))
+            count += 1
+        out.write('\n]' if count else '[]')
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, file_path)
+    return count
+
+
+def write_jsonl(file_path, records, ensure_ascii=False):
+    tmp_path = f"{file_path}.tmp"
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=ensure_ascii) + '\n')
+            count += 1
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, file_path)
+    return count
+
+
+def read_records(file_path):
+    # Records from a .jsonl file or a word store (.sqlite), both streamed, or
+    # from a JSON array file.
+    if file_path.endswith('.jsonl'):
+        yield from read_journal(file_path)
+        return
+    if file_path.endswith('.sqlite'):
+        from word_store import WordStore
+        with WordStore(file_path) as store:
+            yield from store.iter_entries()
+        return
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from json.load(f)
+
+
+def write_records(file_path, records, indent=2, ensure_ascii=True):
+    # One record per line for .jsonl, a word store for .sqlite, otherwise the
+    # indented JSON array layout.
+    if file_path.endswith('.sqlite'):
+        from word_store import WordStore
+        with WordStore(file_path) as store:
+            return store.import_records(records)
+    if file_path.endswith('.jsonl'):
+        return write_jsonl(file_path, records, ensure_ascii=ensure_ascii)
+    return write_json_array(file_path, records, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def latest_records(journal_path, key, deleted=None):
+    # {key: record} holding the latest record for each key, in the order the
+    # keys first appeared. A record `deleted` returns true for drops its key
+    # until a later record brings it back.
+    latest = {}
+    for record in read_journal(journal_path):
+        k = key(record)
+        if deleted is not None and deleted(record):
+            latest.pop(k, None)
+        else:
+            latest[k] = record
+    return latest
+
+
+def compact_journal(journal_path, output_path, key=None, indent=2, ensure_ascii=True, include=None, deleted=None):
+    # Writes the journal out as a single JSON array (or JSONL when the output
+    # ends in .jsonl). When `key` is given only the latest record for each key
+    # is kept (see latest_records); when `include` is given only records it
+    # returns true for.
+    if key is None:
+        records = read_journal(journal_path)
+    else:
+        records = latest_records(journal_path, key, deleted).values()
+    if include is not None:
+        records = (record for record in records if include(record))
+    return write_records(output_path, records, indent=indent, ensure_ascii=ensure_ascii)
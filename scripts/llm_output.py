@@ -0,0 +1,174 @@
+import ast
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+WORD_FIELDS = ['word', 'definition', 'wordType', 'examples', 'synonyms', 'antonyms']
+LIST_FIELDS = ['examples', 'synonyms', 'antonyms']
+
+FENCE_RE = re.compile(r'```(?:json|JSON)?\s*(.*?)```', re.DOTALL)
+TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+
+
+def find_balanced(text, start):
+    # Returns the end index of the bracketed value opening at text[start],
+    # ignoring brackets that appear inside string literals.
+    opening = text[start]
+    closing = '}' if opening == '{' else ']'
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == quote:
+                quote = None
+        elif c in '"\'' and (c == '"' or text[i - 1] in '{[,: \n\t'):
+            quote = c
+        elif c == opening:
+            depth += 1
+        elif c == closing:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def candidate_snippets(text, opening='{'):
+    # Fenced blocks first, then every balanced value in the raw text.
+    sources = FENCE_RE.findall(text) + [text]
+    for source in sources:
+        start = source.find(opening)
+        while start != -1:
+            end = find_balanced(source, start)
+            if end is not None:
+                yield source[start:end]
+            start = source.find(opening, start + 1)
+
+
+def loads_lenient(snippet):
+    try:
+        return json.loads(snippet), False
+    except json.JSONDecodeError:
+        pass
+    repaired = TRAILING_COMMA_RE.sub(r'\1', snippet.translate(SMART_QUOTES))
+    try:
+        return json.loads(repaired), True
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Single-quoted, Python-style dicts are a common near miss.
+        return ast.literal_eval(repaired), True
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None, False
+
+
+def extract_json(text, opening='{'):
+    # Returns (value, repaired) for the first JSON object (or array, with
+    # opening='[') that can be recovered from a model reply.
+    expected = dict if opening == '{' else list
+    for snippet in candidate_snippets(text, opening):
+        value, repaired = loads_lenient(snippet)
+        if isinstance(value, expected):
+            return value, repaired
+    return None, False
+
+
+def normalize_list(value):
+    if isinstance(value, str):
+        value = re.split(r'\s*[,;]\s*', value)
+    if not isinstance(value, list):
+        return None
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def validate_word_entry(data, word):
+    # Returns (entry, errors). The entry only contains the schema fields,
+    # in schema order, with list fields normalized.
+    if not isinstance(data, dict):
+        return None, ['not an object']
+    errors = []
+    missing = [field for field in WORD_FIELDS if field not in data]
+    if missing:
+        errors.append(f"missing fields: {', '.join(missing)}")
+
+    entry = {}
+    for field in WORD_FIELDS:
+        value = data.get(field)
+        if field in LIST_FIELDS:
+            value = normalize_list(value)
+            if value is None:
+                errors.append(f"'{field}' is not a list")
+            elif field == 'examples' and not value:
+                errors.append("'examples' is empty")
+        elif not isinstance(value, str) or not value.strip():
+            errors.append(f"'{field}' is not a non-empty string")
+        else:
+            value = value.strip()
+        entry[field] = value
+
+    if isinstance(entry['word'], str) and entry['word'].lower() != word.lower():
+        errors.append(f"'word' is '{entry['word']}', expected '{word}'")
+    return (None, errors) if errors else (entry, [])
+
+
+def parse_word_entry(text, word):
+    # Returns (entry, repaired, errors) for a raw model reply.
+    data, repaired = extract_json(text)
+    if data is None:
+        return None, False, ['no JSON object found']
+    entry, errors = validate_word_entry(data, word)
+    return entry, repaired, errors
+
+
+class ResponseCache:
+    # Persistent (model, prompt hash) -> response store so reruns and crash
+    # recoveries never repeat a generation that already succeeded. Once
+    # closed, lookups miss and stores are dropped: worker threads still
+    # finishing a request after an interrupt may call in after close().
+    def __init__(self, file_path):
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(file_path, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+            model TEXT NOT NULL,
+            prompt_hash TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (model, prompt_hash))''')
+        self._conn.commit()
+
+    @staticmethod
+    def prompt_hash(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+    def get(self, model, prompt):
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._conn.execute(
+                'SELECT response FROM responses WHERE model = ? AND prompt_hash = ?',
+                (model, self.prompt_hash(prompt))).fetchone()
+        return row[0] if row else None
+
+    def put(self, model, prompt, response):
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (model, self.prompt_hash(prompt), response, time.time()))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._conn.close()
@@ -0,0 +1,216 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# In-process counters and latency histograms for the generation and
+# verification loops. Scripts record into `metrics.current`, which is a no-op
+# NullMetrics unless enable() was called, so instrumented code costs next to
+# nothing when metrics are off. When on, a background thread writes
+# <directory>/<script>.prom (Prometheus text format, e.g. for node_exporter's
+# textfile collector) and <directory>/<script>.json (a summary with
+# percentiles) every `interval` seconds and once more at stop().
+
+# Upper bounds in seconds, from a cache hit to a slow model reply
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Interpolated within the bucket holding the q-th observation
+        if not self.count:
+            return None
+        return round(self._quantile(q), 6)
+
+    def _quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+def format_labels(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, script):
+        self.script = script
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.directory = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def prometheus(self):
+        script = (('script', self.script),)
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{format_labels(script + labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(script + labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(script + labels)} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels(script + labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        with self.lock:
+            counters = {name + format_labels(labels): value for (name, labels), value in sorted(self.counters.items())}
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms[name + format_labels(labels)] = {
+                    'count': histogram.count,
+                    'total_seconds': round(histogram.sum, 6),
+                    'mean': round(histogram.sum / histogram.count, 6) if histogram.count else None,
+                    'p50': histogram.quantile(0.5),
+                    'p90': histogram.quantile(0.9),
+                    'p99': histogram.quantile(0.99),
+                }
+            tokens_per_second = {}
+            for (name, labels), tokens in self.counters.items():
+                if name == 'llm_eval_tokens_total':
+                    seconds = self.counters.get(('llm_eval_seconds_total', labels))
+                    if seconds:
+                        tokens_per_second[format_labels(labels) or 'all'] = round(tokens / seconds, 2)
+        now = time.time()
+        return {
+            'script': self.script,
+            'started_at': self.started_at,
+            'updated_at': now,
+            'uptime_seconds': round(now - self.started_at, 3),
+            'counters': counters,
+            'histograms': histograms,
+            'tokens_per_second': tokens_per_second,
+        }
+
+    def write(self, directory):
+        # tmp + rename, so a collector never reads a half-written file
+        os.makedirs(directory, exist_ok=True)
+        for extension, text in (('prom', self.prometheus()), ('json', json.dumps(self.summary(), indent=2))):
+            path = os.path.join(directory, f'{self.script}.{extension}')
+            with open(f'{path}.tmp', 'w') as f:
+                f.write(text)
+            os.replace(f'{path}.tmp', path)
+
+    def start_exporter(self, directory, interval=15):
+        self.directory = directory
+
+        def export():
+            while not self._stop.wait(interval):
+                self.write(directory)
+
+        self._thread = threading.Thread(target=export, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.directory is not None:
+            self.write(self.directory)
+
+
+class Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class NullMetrics:
+    enabled = False
+    _timer = nullcontext()
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return self._timer
+
+    def stop(self):
+        pass
+
+
+current = NullMetrics()
+
+
+def enable(script, directory, interval=15):
+    global current
+    current = Metrics(script)
+    current.start_exporter(directory, interval)
+    return current
+
+
+def record_chat(purpose, seconds, response=None, error=None):
+    # One model call. Ollama replies report generated tokens (eval_count)
+    # and the time spent generating them (eval_duration, in nanoseconds).
+    metrics = current
+    if not metrics.enabled:
+        return
+    metrics.observe('llm_request_seconds', seconds, purpose=purpose)
+    metrics.inc('llm_requests_total', purpose=purpose, outcome='error' if error else 'ok')
+    if response is not None:
+        eval_count = response.get('eval_count') or 0
+        eval_duration = response.get('eval_duration') or 0
+        metrics.inc('llm_prompt_tokens_total', response.get('prompt_eval_count') or 0, purpose=purpose)
+        metrics.inc('llm_eval_tokens_total', eval_count, purpose=purpose)
+        metrics.inc('llm_eval_seconds_total', eval_duration / 1e9 if eval_duration else seconds, purpose=purpose)
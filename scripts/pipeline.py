@@ -0,0 +1,340 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from journal import read_records, write_jsonl
+
+# Runs the scripts as one DAG: scrape -> csv2json -> dbprep -> genDB ->
+# improve_quality -> corrections -> comb_contents / rank_words -> sync_words /
+# export_packs, passing JSON Lines between stages. prefetch_audio caches the
+# pronunciation audio linked from dbprep's output, alongside genDB. A stage is
+# skipped when its command, code (the script and the local modules it imports)
+# and input files hash the same as on its last successful run and its outputs
+# are untouched. Independent stages run in parallel.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = 'pipeline_state.json'
+LOG_DIR = 'pipeline_logs'
+
+
+class Stage:
+    def __init__(self, name, inputs, outputs, script=None, args=(), tuning=(), function=None, publish=False,
+                 optional=()):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.script = script
+        self.args = list(args)
+        # Arguments that don't change the output (e.g. --workers) and so
+        # aren't part of the stage's hash
+        self.tuning = list(tuning)
+        self.function = function
+        # Publish stages write to Firestore and only run with --publish
+        self.publish = publish
+        # Inputs that may be missing, e.g. an empty corrections file
+        self.optional = set(optional)
+
+    def command(self):
+        return [sys.executable, os.path.join(SCRIPT_DIR, self.script)] + self.args + self.tuning
+
+
+def apply_corrections(corpus_file, corrections_file, output_file):
+    # Hand corrections override verified entries field by field, keyed by the
+    # lowercased word; {"word": ..., "delete": true} removes an entry.
+    corrections = {}
+    if os.path.exists(corrections_file):
+        for correction in read_records(corrections_file):
+            corrections[correction['word'].lower()] = correction
+
+    def corrected():
+        for entry in read_records(corpus_file):
+            correction = corrections.pop(entry['word'].lower(), None)
+            if correction is None:
+                yield entry
+            elif not correction.get('delete'):
+                yield {**entry, **correction}
+
+    count = write_jsonl(output_file, corrected())
+    for word in corrections:
+        print(f"Correction for '{word}' matches no entry; ignored")
+    print(f"Wrote {count} entries to {output_file}")
+
+
+def build_stages(args):
+    backend = ['--fake'] if args.fake else (['--emulator', args.emulator] if args.emulator else [])
+    workers = ['--workers', str(args.workers)]
+    dictionary = ['--base-url', args.dictionary_url] if args.dictionary_url else []
+    return [
+        Stage('scrape', ['word-frequency.txt'], ['scrape.csv'], 'data-scrape.py',
+              ['--input', 'word-frequency.txt', '--output', 'scrape.csv', '--restart'] + dictionary),
+        Stage('convert', ['scrape.csv'], ['scrape.jsonl'], 'csv2json.py',
+              ['--input', 'scrape.csv', '--output', 'scrape.jsonl'], workers),
+        Stage('extract', ['scrape.jsonl'], ['word_data.jsonl'], 'dbprep.py',
+              ['--input', 'scrape.jsonl', '--output', 'word_data.jsonl', '--jsonl'], workers),
+        Stage('audio', ['word_data.jsonl'], ['audio_manifest.jsonl'], 'prefetch_audio.py',
+              ['--input', 'word_data.jsonl', '--manifest', 'audio_manifest.jsonl']),
+        Stage('generate', ['word_data.jsonl'], ['generated_words.jsonl'], 'genDB.py',
+              ['--input', 'word_data.jsonl', '--output', 'generated_words.jsonl', '--restart', '--only-input']),
+        Stage('verify', ['generated_words.jsonl'], ['verified_words.jsonl'], 'improve_quality.py',
+              ['--input', 'generated_words.jsonl', '--output', 'verified_words.jsonl']),
+        Stage('correct', ['verified_words.jsonl', 'corrections.jsonl'], ['words.jsonl'],
+              function=apply_corrections, optional=['corrections.jsonl']),
+        Stage('scan', ['words.jsonl'], ['swear_report.json'], 'comb_contents.py',
+              ['--input', 'words.jsonl', '--swears', os.path.join(SCRIPT_DIR, 'swears.json'),
+               '--report', 'swear_report.json', '--quiet'], workers),
+        Stage('rank', ['words.jsonl', 'word-frequency.txt'], ['word_ranking.csv'], 'rank_words.py',
+              ['--input', 'words.jsonl', '--frequency', 'word-frequency.txt', '--output', 'word_ranking.csv']),
+        Stage('sync', ['words.jsonl', 'word_ranking.csv'], ['sync_report.json'], 'sync_words.py',
+              ['--input', 'words.jsonl', '--ranking', 'word_ranking.csv', '--report', 'sync_report.json'] + backend,
+              publish=True),
+        Stage('packs', ['words.jsonl', 'word_ranking.csv'], ['word_packs.jsonl'], 'export_packs.py',
+              ['--input', 'words.jsonl', '--ranking', 'word_ranking.csv', '--output', 'word_packs.jsonl'] + backend,
+              publish=True),
+    ]
+
+
+def local_modules(script, seen=None):
+    # The script plus every module it imports from this directory, recursively
+    seen = set() if seen is None else seen
+    if script in seen:
+        return seen
+    seen.add(script)
+    with open(os.path.join(SCRIPT_DIR, script), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            module = f"{name.split('.')[0]}.py"
+            if os.path.exists(os.path.join(SCRIPT_DIR, module)):
+                local_modules(module, seen)
+    return seen
+
+
+class FileHashes:
+    # sha256 of files, remembered by (size, mtime) so unchanged inputs aren't
+    # read again on every run.
+    def __init__(self, known):
+        self.known = known
+        self.lock = threading.Lock()
+
+    def get(self, file_path):
+        if not os.path.exists(file_path):
+            return None
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        with self.lock:
+            known = self.known.get(key)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        with self.lock:
+            self.known[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+
+def stage_key(stage, hashes):
+    # Returns the stage's hash, or None when a required input is missing.
+    command = [stage.function.__name__] if stage.function else [stage.script] + stage.args
+    digest = hashlib.sha256(json.dumps(command).encode('utf-8'))
+    code = local_modules(stage.script) if stage.script else {os.path.basename(__file__), 'journal.py'}
+    for module in sorted(code):
+        digest.update(f"{module}:{hashes.get(os.path.join(SCRIPT_DIR, module))}".encode('utf-8'))
+    for file_path in stage.inputs:
+        file_hash = hashes.get(file_path)
+        if file_hash is None and file_path not in stage.optional:
+            return None
+        digest.update(f"{file_path}:{file_hash}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def up_to_date(stage, key, state, hashes):
+    previous = state['stages'].get(stage.name)
+    if previous is None or previous['key'] != key:
+        return False
+    # Outputs edited or deleted by hand are rebuilt
+    return all(hashes.get(file_path) == previous['outputs'].get(file_path) for file_path in stage.outputs)
+
+
+def run_stage(stage):
+    # Runs the stage with its output going to pipeline_logs/<stage>.log.
+    # Returns (ok, seconds).
+    log_file = os.path.join(LOG_DIR, f"{stage.name}.log")
+    start = time.perf_counter()
+    with open(log_file, 'w', encoding='utf-8') as log:
+        if stage.function is not None:
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-function', stage.name],
+                                     stdout=log, stderr=subprocess.STDOUT)
+        else:
+            process = subprocess.run(stage.command(), stdout=log, stderr=subprocess.STDOUT)
+    return process.returncode == 0, time.perf_counter() - start
+
+
+def log_tail(stage, lines=10):
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), 'r', encoding='utf-8', errors='replace') as f:
+        return f.readlines()[-lines:]
+
+
+def load_state(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    return {'files': {}, 'stages': {}}
+
+
+def save_state(file_path, state):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, file_path)
+
+
+def select(stages, targets, publish):
+    # The requested stages plus everything upstream of them, in DAG order
+    by_name = {stage.name: stage for stage in stages}
+    producer = {output: stage.name for stage in stages for output in stage.outputs}
+    wanted = set()
+    todo = list(targets or [stage.name for stage in stages if publish or not stage.publish])
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(producer[file_path] for file_path in by_name[name].inputs if file_path in producer)
+    upstream = {stage.name: {producer[file_path] for file_path in stage.inputs if file_path in producer} & wanted
+                for stage in stages if stage.name in wanted}
+    return [stage for stage in stages if stage.name in wanted], upstream
+
+
+def run(stages, upstream, state, hashes, jobs, force, dry_run):
+    # Starts each stage once everything upstream of it has finished. Returns
+    # {stage name: 'ran' | 'skipped' | 'failed' | 'blocked' | 'would run'}.
+    status = {}
+    state_lock = threading.Lock()
+    running = {}
+    remaining = list(stages)
+
+    def execute(stage):
+        key = stage_key(stage, hashes)
+        if key is None:
+            missing = [f for f in stage.inputs if not os.path.exists(f) and f not in stage.optional]
+            print(f"[{stage.name}] missing input {', '.join(missing)}")
+            return 'failed'
+        if stage.name not in force and up_to_date(stage, key, state, hashes):
+            print(f"[{stage.name}] up to date")
+            return 'skipped'
+        if dry_run:
+            print(f"[{stage.name}] would run")
+            return 'would run'
+        print(f"[{stage.name}] running")
+        ok, seconds = run_stage(stage)
+        if not ok:
+            print(f"[{stage.name}] failed after {seconds:.1f}s; last lines of {LOG_DIR}/{stage.name}.log:")
+            print(''.join(f"    {line}" for line in log_tail(stage)), end='')
+            return 'failed'
+        with state_lock:
+            state['stages'][stage.name] = {
+                'key': key,
+                'outputs': {file_path: hashes.get(file_path) for file_path in stage.outputs},
+                'seconds': round(seconds, 3),
+                'finished_at': time.time(),
+            }
+            save_state(STATE_FILE, state)
+        print(f"[{stage.name}] done in {seconds:.1f}s")
+        return 'ran'
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while remaining or running:
+            for stage in list(remaining):
+                before = [status.get(name) for name in upstream[stage.name]]
+                if any(s in ('failed', 'blocked') for s in before):
+                    status[stage.name] = 'blocked'
+                    remaining.remove(stage)
+                elif dry_run and 'would run' in before:
+                    # Its inputs will change, so it can't be judged yet
+                    print(f"[{stage.name}] would run if its inputs change")
+                    status[stage.name] = 'would run'
+                    remaining.remove(stage)
+                elif all(s is not None for s in before):
+                    running[executor.submit(execute, stage)] = stage
+                    remaining.remove(stage)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[running.pop(future).name] = future.result()
+    return status
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--run-function':
+        defaults = argparse.Namespace(fake=False, emulator=None, workers=1, dictionary_url=None)
+        stage = next(s for s in build_stages(defaults)
+                     if s.name == sys.argv[2])
+        stage.function(*stage.inputs, *stage.outputs)
+        return
+
+    parser = argparse.ArgumentParser(description='Run the word pipeline, skipping stages that are up to date.')
+    parser.add_argument('targets', nargs='*',
+                        help='Stages to bring up to date, with everything upstream (default: all but publish stages)')
+    parser.add_argument('--workdir', default='.',
+                        help='Directory holding the inputs, outputs and pipeline state')
+    parser.add_argument('--jobs', type=int, default=4,
+                        help='Stages run at the same time (default: 4)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes for the stages that can parallelise internally')
+    parser.add_argument('--publish', action='store_true',
+                        help='Also run the stages that write to Firestore')
+    parser.add_argument('--fake', action='store_true',
+                        help='Publish stages write to an in-process fake backend')
+    parser.add_argument('--emulator', metavar='HOST:PORT')
+    parser.add_argument('--dictionary-url', help='Scrape from this endpoint, e.g. a local stub server')
+    parser.add_argument('--force', nargs='+', default=[], metavar='STAGE',
+                        help='Run these stages even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only report which stages would run')
+    parser.add_argument('--list', action='store_true', help='List the stages and exit')
+    args = parser.parse_args()
+
+    stages = build_stages(args)
+    names = [stage.name for stage in stages]
+    for name in args.targets + args.force:
+        if name not in names:
+            parser.error(f"unknown stage '{name}' (stages: {', '.join(names)})")
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name:<10}{' (publish)' if stage.publish else '':<11}"
+                  f"{', '.join(stage.inputs)} -> {', '.join(stage.outputs)}")
+        return
+
+    os.chdir(args.workdir)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    state = load_state(STATE_FILE)
+    hashes = FileHashes(state['files'])
+    selected, upstream = select(stages, args.targets, args.publish)
+
+    start = time.perf_counter()
+    status = run(selected, upstream, state, hashes, max(1, args.jobs), set(args.force), args.dry_run)
+    save_state(STATE_FILE, state)
+    counts = {s: list(status.values()).count(s) for s in ('ran', 'skipped', 'would run', 'failed', 'blocked')}
+    print(f"Pipeline finished in {time.perf_counter() - start:.1f}s: "
+          + ', '.join(f"{count} {s}" for s, count in counts.items() if count))
+    if counts['failed'] or counts['blocked']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import posixpath
+import random
+import sqlite3
+import time
+from collections import Counter
+
+import aiohttp
+
+import dbprep
+from dictionary_client import make_session, parse_retry_after
+from journal import read_records, write_jsonl
+
+# Downloads the pronunciation audio that dbprep records as audioUrl into a
+# local content-addressed cache, so the app can be served from it instead of
+# streaming from the dictionary's host, and dead links show up here rather
+# than in the app. Each distinct URL is fetched once per run, and files with
+# identical content are stored once. The index remembers every URL's ETag
+# and Last-Modified, so a re-run only sends conditional requests and
+# downloads nothing that is unchanged.
+
+CACHE_DIR = 'audio_cache'
+
+# Leading bytes of the formats dictionary audio comes in
+SIGNATURES = ((b'ID3', '.mp3'), (b'OggS', '.ogg'), (b'RIFF', '.wav'), (b'fLaC', '.flac'))
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    hash TEXT,
+    path TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER,
+    fetched_at REAL NOT NULL,
+    error TEXT
+)
+'''
+
+
+def normalize_url(url):
+    # dictionaryapi.dev sometimes gives protocol-relative links
+    url = url.strip()
+    return 'https:' + url if url.startswith('//') else url
+
+
+def audio_extension(data, content_type):
+    # The file type, or None if this isn't audio (e.g. an HTML error page
+    # served with a 200)
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0:
+        return '.mp3'  # MPEG frame without an ID3 tag
+    if content_type.startswith('audio/') and data and not data.lstrip().startswith(b'<'):
+        return '.' + content_type.split('/', 1)[1].split(';')[0].strip().replace('mpeg', 'mp3')
+    return None
+
+
+class AudioCache:
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'index.sqlite'))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(INDEX_SCHEMA)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def get(self, url):
+        row = self.db.execute('SELECT * FROM urls WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def has_object(self, path):
+        return path is not None and os.path.exists(os.path.join(self.root, path))
+
+    def store(self, data, extension):
+        # Returns (hash, path relative to the cache, whether it was new). The
+        # path uses '/' on every OS since it also ends up in URLs.
+        digest = hashlib.sha256(data).hexdigest()
+        path = posixpath.join('objects', digest[:2], digest + extension)
+        full_path = os.path.join(self.root, path)
+        if os.path.exists(full_path):
+            return digest, path, False
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(f'{full_path}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{full_path}.tmp', full_path)
+        return digest, path, True
+
+    def record(self, url, status, http_status=None, error=None, **fields):
+        # Keeps the last good file (and its validators) unless new ones are given
+        previous = self.get(url) or {}
+        row = {key: previous.get(key) for key in ('hash', 'path', 'etag', 'last_modified', 'size')}
+        row.update(fields)
+        self.db.execute('INSERT OR REPLACE INTO urls (url, status, http_status, hash, path, etag, last_modified, '
+                        'size, fetched_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (url, status, http_status, row['hash'], row['path'], row['etag'], row['last_modified'],
+                         row['size'], time.time(), error))
+
+
+async def fetch_audio(session, url, cached, max_retries=4):
+    # Returns (http status, body, headers, error). The body is None for 304s
+    # and failures.
+    headers = {}
+    if cached and cached.get('path'):
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    error = None
+    for attempt in range(max_retries):
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 429 or response.status >= 500:
+                    error = f'HTTP {response.status}'
+                    delay = parse_retry_after(response.headers.get('Retry-After'))
+                    if delay is None:
+                        delay = min(30, 2 ** attempt) * (0.5 + random.random())
+                    await asyncio.sleep(delay)
+                    continue
+                body = await response.read() if response.status == 200 else None
+                return response.status, body, response.headers, None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            error = repr(e)
+            await asyncio.sleep(min(30, 2 ** attempt) * (0.5 + random.random()))
+    return None, None, {}, error
+
+
+async def prefetch(urls, cache, concurrency, on_result):
+    # `concurrency` workers share one pooled session and a queue of URLs
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    async def worker(session):
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            cached = cache.get(url)
+            if cached and not cache.has_object(cached['path']):
+                cached = None  # the file is gone, so fetch it unconditionally
+            on_result(url, cached, *await fetch_audio(session, url, cached))
+
+    async with make_session(concurrency) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download and cache the audio files dbprep records link to.')
+    parser.add_argument('--input', default='word_data_processed.json', help="dbprep's output (JSON or JSONL)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--manifest', default='audio_manifest.jsonl',
+                        help='Per word: the original audioUrl, its cached location and status')
+    parser.add_argument('--output',
+                        help="Also write the input records with audioUrl rewritten to the cache, in dbprep's "
+                             "format (JSON Lines if the name ends in .jsonl)")
+    parser.add_argument('--base-url',
+                        help='Where the cache directory is served from, e.g. https://cdn.example.com/audio '
+                             '(default: the local path)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    records = list(read_records(args.input))
+    words_by_url = {}
+    for record in records:
+        if record.get('audioUrl'):
+            words_by_url.setdefault(normalize_url(record['audioUrl']), []).append(record['Word'])
+    linked = sum(len(words) for words in words_by_url.values())
+    print(f"{len(records)} words, {linked} with audio, {len(words_by_url)} distinct URLs")
+
+    cache = AudioCache(args.cache_dir)
+    counts = Counter()
+    downloaded = 0
+    done = 0
+
+    def on_result(url, cached, http_status, body, headers, error):
+        nonlocal downloaded, done
+        if http_status == 304 and cached and cache.has_object(cached['path']):
+            cache.record(url, 'ok', http_status, etag=headers.get('ETag', cached['etag']))
+            counts['not modified'] += 1
+        elif http_status == 200:
+            downloaded += len(body)
+            extension = audio_extension(body, headers.get('Content-Type', ''))
+            if extension is None:
+                cache.record(url, 'invalid', http_status, f"not audio ({headers.get('Content-Type')})")
+                counts['not audio'] += 1
+            else:
+                digest, path, new = cache.store(body, extension)
+                cache.record(url, 'ok', http_status, hash=digest, path=path, size=len(body),
+                             etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
+                counts['downloaded, new file' if new else 'downloaded, same content as another URL'] += 1
+        elif http_status in (404, 410):
+            cache.record(url, 'dead', http_status)
+            counts['dead links'] += 1
+        else:
+            cache.record(url, 'error', http_status, error or f'HTTP {http_status}')
+            counts['failed'] += 1
+        done += 1
+        if done % 500 == 0:
+            cache.db.commit()
+            print(f"{done}/{len(words_by_url)} URLs checked")
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(prefetch(list(words_by_url), cache, max(1, args.concurrency), on_result))
+    except KeyboardInterrupt:
+        print("\nInterrupted; the next run picks up where this one stopped.")
+    cache.db.commit()
+    elapsed = time.perf_counter() - start
+
+    base = (args.base_url or args.cache_dir).rstrip('/')
+
+    def manifest_rows():
+        for record in records:
+            url = normalize_url(record['audioUrl']) if record.get('audioUrl') else None
+            row = cache.get(url) if url else None
+            # A dead link still gets the last copy that was downloaded. Paths
+            # indexed on Windows before paths were always '/' need converting.
+            cached = f"{base}/{row['path'].replace(os.sep, '/')}" if row and row['path'] else None
+            yield {'word': record['Word'], 'audioUrl': record.get('audioUrl'), 'cachedAudio': cached,
+                   'hash': row['hash'] if row else None, 'status': row['status'] if row else None}
+
+    count = write_jsonl(args.manifest, manifest_rows())
+    if args.output:
+        cached_by_word = {row['word']: row['cachedAudio'] for row in read_records(args.manifest)}
+        dbprep.write_records(args.output, ({**record, 'audioUrl': cached_by_word.get(record['Word'])
+                                            or record.get('audioUrl')} for record in records),
+                             jsonl=args.output.endswith('.jsonl'))
+        print(f"Wrote {args.output} with audioUrl pointing at {base}")
+    cache.close()
+
+    print(f"Checked {done} URLs in {elapsed:.1f}s, downloaded {downloaded / 1e6:.1f} MB")
+    for outcome, number in counts.most_common():
+        print(f"  {outcome}: {number}")
+    print(f"Manifest for {count} words saved to {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from firestore_io import word_doc_id
+from uploadToDb import difficulties, load_words
+
+# Ranks the corpus by how hard each word is likely to be and assigns balanced
+# (difficulty, index) positions. The table is written to word_ranking.csv,
+# which uploadToDb, sync_words and export_packs use when it exists, so the
+# uploaded documents and the app's (difficulty, index) queries agree.
+
+# Weights of each feature's percentile in the difficulty score
+FREQUENCY_WEIGHT = 0.7
+LENGTH_WEIGHT = 0.2
+SYLLABLE_WEIGHT = 0.1
+
+
+def load_frequency_ranks(file_path):
+    # word-frequency.txt lists words from most to least frequent; the word is
+    # the second whitespace-separated column.
+    freq = pd.read_csv(file_path, sep=r'\s+', header=None, usecols=[1], names=['word'],
+                       dtype=str, keep_default_na=False, quoting=3)
+    freq['key'] = freq['word'].str.lower()
+    freq['frequencyRank'] = np.arange(1, len(freq) + 1)
+    return freq.drop_duplicates('key')[['key', 'frequencyRank']]
+
+
+def rank_words(words, freq):
+    # `words` is the corpus word list in file order. Returns the ranking table
+    # ordered by (difficulty, index).
+    table = pd.DataFrame({'word': words})
+    table['key'] = table['word'].str.lower()
+    table['docId'] = [word_doc_id(word) for word in words]
+    table = table.merge(freq, on='key', how='left')
+    # Words missing from the frequency list are treated as the rarest
+    table['frequencyRank'] = table['frequencyRank'].fillna(len(freq) + 1).astype(np.int64)
+    table['length'] = table['key'].str.len()
+    table['syllables'] = table['key'].str.count(r'[aeiouy]+').clip(lower=1)
+
+    table['score'] = (FREQUENCY_WEIGHT * table['frequencyRank'].rank(pct=True)
+                      + LENGTH_WEIGHT * table['length'].rank(pct=True)
+                      + SYLLABLE_WEIGHT * table['syllables'].rank(pct=True))
+
+    # Stable sort keeps corpus order for ties, then cut into equal buckets
+    order = np.argsort(table['score'].to_numpy(), kind='stable')
+    table = table.iloc[order].reset_index(drop=True)
+    position = np.arange(len(table))
+    bucket = position * len(difficulties) // max(len(table), 1)
+    bucket_start = np.searchsorted(bucket, bucket, side='left')
+    table['difficulty'] = np.array(difficulties)[bucket]
+    table['index'] = position - bucket_start
+    return table[['docId', 'word', 'difficulty', 'index', 'score', 'frequencyRank', 'length', 'syllables']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign difficulty buckets and indices by word frequency.')
+    parser.add_argument('--input', default='processed_words.json')
+    parser.add_argument('--frequency', default='word-frequency.txt')
+    parser.add_argument('--output', default='word_ranking.csv')
+    args = parser.parse_args()
+
+    words = [entry['word'] for entry in load_words(args.input)]
+    start = time.perf_counter()
+    table = rank_words(words, load_frequency_ranks(args.frequency))
+    elapsed = time.perf_counter() - start
+    table.to_csv(args.output, index=False)
+
+    print(f"Ranked {len(table)} words in {elapsed:.2f}s; saved to {args.output}")
+    print(table.groupby('difficulty', sort=False)['frequencyRank'].median().rename('median frequency rank'))
+
+
+if __name__ == '__main__':
+    main()
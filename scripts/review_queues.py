@@ -0,0 +1,290 @@
+import argparse
+import heapq
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from firestore_io import BATCH_LIMIT, FirestoreSink, FirestoreSource, MemorySink, init_firestore, write_batches
+from uploadToDb import build_docs, difficulties, iter_batches, load_ranking, load_words
+
+# Precomputes each user's next review queue, so the app reads one document
+# per session instead of querying userWords by (userId, progress) and
+# (learned, userId, lastSeenAt).
+#
+# userWords is scanned incrementally, in lastSeenAt order from the cursor the
+# last run stopped at, into a local SQLite mirror. Only users with a changed
+# document get their queue rebuilt from the mirror. A queue lists the user's
+# unlearned words by when they are due (lastSeenAt plus an interval that
+# grows with progress), then difficulty and index. Due times are absolute,
+# so a queue only goes stale when the user's words change.
+#
+# Deleted userWords documents never show up in a changed-since scan; --full
+# rebuilds the mirror from scratch.
+
+STATE_FILE = 'review_queues.sqlite'
+QUEUE_SIZE = 50
+
+# Time until a word is due again, by progress (the last interval repeats)
+REVIEW_INTERVALS = [timedelta(minutes=10), timedelta(hours=1), timedelta(days=1), timedelta(days=3),
+                    timedelta(days=7), timedelta(days=14), timedelta(days=30)]
+INTERVAL_SECONDS = [interval.total_seconds() for interval in REVIEW_INTERVALS]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+-- Clustered by user, so rebuilding a queue reads one contiguous run
+CREATE TABLE IF NOT EXISTS user_words (
+    user_id TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    word_id TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    learned INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (user_id, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirty (user_id TEXT PRIMARY KEY);
+'''
+
+
+class ReviewState:
+    # The mirror of userWords, the scan cursor, and the users whose queue
+    # still has to be written. The cursor moves in the same transaction as
+    # the documents it covers, and users stay dirty until their queue is
+    # committed, so an interrupted run loses nothing.
+    def __init__(self, file_path=STATE_FILE):
+        self.db = sqlite3.connect(file_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def reset(self):
+        with self.db:
+            for table in ('meta', 'user_words', 'dirty'):
+                self.db.execute(f'DELETE FROM {table}')
+
+    def cursor(self):
+        rows = dict(self.db.execute("SELECT key, value FROM meta WHERE key IN ('cursor_time', 'cursor_id')"))
+        if 'cursor_time' not in rows:
+            return None
+        return datetime.fromisoformat(rows['cursor_time']), rows['cursor_id']
+
+    def apply(self, page):
+        # Stores one page of (doc_id, data) from the scan and advances the cursor
+        rows = []
+        for doc_id, data in page:
+            if not data.get('userId') or not data.get('wordId'):
+                continue
+            progress = data.get('progress')
+            rows.append((data['userId'], doc_id, data['wordId'], progress if isinstance(progress, int) else 0,
+                         1 if data.get('learned') else 0, data['lastSeenAt'].timestamp()))
+        last_id, last_data = page[-1]
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO user_words (user_id, doc_id, word_id, progress, learned, '
+                                'last_seen) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self.db.executemany('INSERT OR IGNORE INTO dirty (user_id) VALUES (?)',
+                                [(user_id,) for user_id in {row[0] for row in rows}])
+            self.db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                [('cursor_time', last_data['lastSeenAt'].isoformat()), ('cursor_id', last_id)])
+        return len(rows)
+
+    def dirty_count(self):
+        return self.db.execute('SELECT COUNT(*) FROM dirty').fetchone()[0]
+
+    def dirty_users(self):
+        # Yields (user_id, [(word_id, progress, learned, last_seen), ...])
+        rows = self.db.execute('SELECT user_id, word_id, progress, learned, last_seen FROM user_words '
+                               'WHERE user_id IN (SELECT user_id FROM dirty) ORDER BY user_id')
+        for user_id, group in groupby(rows, key=lambda row: row[0]):
+            yield user_id, [row[1:] for row in group]
+
+    def mark_written(self, user_ids):
+        with self.db:
+            self.db.executemany('DELETE FROM dirty WHERE user_id = ?', [(user_id,) for user_id in user_ids])
+
+
+def due_at(progress, last_seen):
+    return last_seen + INTERVAL_SECONDS[min(max(progress, 0), len(INTERVAL_SECONDS) - 1)]
+
+
+def build_queue(user_id, rows, positions, size=QUEUE_SIZE):
+    # `positions` maps word IDs to (difficulty rank, index). Words missing
+    # from it were removed from the collection and are left out.
+    candidates = []
+    furthest = None
+    learned = 0
+    for word_id, progress, is_learned, last_seen in rows:
+        position = positions.get(word_id)
+        if position is None:
+            continue
+        if furthest is None or position > furthest:
+            furthest = position
+        if is_learned:
+            learned += 1
+        else:
+            candidates.append((due_at(progress, last_seen), position[0], position[1], word_id, progress))
+    queue = heapq.nsmallest(size, candidates)
+    # Parallel arrays keep the document small
+    return {
+        'userId': user_id,
+        'wordIds': [item[3] for item in queue],
+        'dueAt': [datetime.fromtimestamp(item[0], timezone.utc) for item in queue],
+        'progress': [item[4] for item in queue],
+        'reviewCount': len(candidates),
+        'learnedCount': learned,
+        # Where new words continue from: the furthest word the user has started
+        'furthest': {'difficulty': difficulties[furthest[0]], 'index': furthest[1]} if furthest else None,
+        'updatedAt': datetime.now(timezone.utc),
+    }
+
+
+def load_positions(pages):
+    positions = {}
+    for page in pages:
+        for doc_id, data in page:
+            if data.get('difficulty') in difficulties and isinstance(data.get('index'), int):
+                positions[doc_id] = (difficulties.index(data['difficulty']), data['index'])
+    return positions
+
+
+def scan(source, state, overlap=0, page_size=BATCH_LIMIT):
+    # Mirrors documents changed since the cursor. `overlap` seconds before the
+    # cursor are read again, to catch writes whose lastSeenAt arrived late.
+    after = state.cursor()
+    if after is not None and overlap:
+        after = (after[0] - timedelta(seconds=overlap),)
+    scanned = stored = 0
+    for page in source.iter_since('lastSeenAt', after, page_size):
+        if page:
+            scanned += len(page)
+            stored += state.apply(page)
+    return scanned, stored
+
+
+def write_queues(state, positions, sink, size=QUEUE_SIZE, batch_size=BATCH_LIMIT, in_flight=4):
+    # Returns (queues written, batches that failed)
+    written = []
+
+    def on_commit(batch_number, ops):
+        written.extend(user_id for user_id, _ in ops)
+        if len(written) % 10000 < len(ops):
+            print(f"{len(written)} queues written")
+
+    queues = ((user_id, build_queue(user_id, rows, positions, size)) for user_id, rows in state.dirty_users())
+    failed = write_batches(sink, iter_batches(queues, batch_size), max_in_flight=in_flight, on_commit=on_commit)
+    state.mark_written(written)
+    return len(written), failed
+
+
+def update_queues(source, state, positions, sink, size=QUEUE_SIZE, overlap=0, batch_size=BATCH_LIMIT,
+                  in_flight=4):
+    start = time.perf_counter()
+    scanned, stored = scan(source, state, overlap, batch_size)
+    scan_seconds = time.perf_counter() - start
+    dirty = state.dirty_count()
+    print(f"Scanned {scanned} changed userWords documents in {scan_seconds:.1f}s; {dirty} queues to rebuild")
+    written, failed = write_queues(state, positions, sink, size, batch_size, in_flight)
+    return {'scanned': scanned, 'stored': stored, 'dirty': dirty, 'written': written, 'failed': failed,
+            'scan_seconds': scan_seconds, 'seconds': time.perf_counter() - start}
+
+
+def fake_store(users, words_per_user=10, word_count=4 * 9001, seed=0):
+    # userWords and words stand-ins. Each user has started a run of
+    # consecutive words, seen at some point in the last 60 days.
+    rng = random.Random(seed)
+    words = MemorySink()
+    for i in range(word_count):
+        words.docs[f'w{i:05d}'] = {'difficulty': difficulties[min(i // 9001, 3)], 'index': i % 9001}
+    user_words = MemorySink(seed=seed)
+    now = datetime.now(timezone.utc)
+    for _ in range(users):
+        user_id = f'{rng.getrandbits(112):028x}'
+        count = rng.randint(1, 2 * words_per_user - 1)
+        first = rng.randrange(word_count - count)
+        for i in range(first, first + count):
+            progress = rng.randint(0, 7)
+            user_words.docs[f'{rng.getrandbits(96):024x}'] = {
+                'userId': user_id, 'wordId': f'w{i:05d}', 'progress': progress, 'learned': progress >= 5,
+                'lastSeenAt': now - timedelta(seconds=rng.uniform(60, 60 * 86400)),
+            }
+    return user_words, words
+
+
+def touch_fake(user_words, count, seed=1):
+    # Simulates `count` reviews since the last run
+    rng = random.Random(seed)
+    for doc_id in rng.sample(sorted(user_words.docs), min(count, len(user_words.docs))):
+        data = user_words.docs[doc_id]
+        progress = data['progress'] + 1
+        user_words.docs[doc_id] = {**data, 'progress': progress, 'learned': progress >= 5,
+                                   'lastSeenAt': datetime.now(timezone.utc)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute per-user review queues from userWords.')
+    parser.add_argument('--collection', default='userWords')
+    parser.add_argument('--words-collection', default='words')
+    parser.add_argument('--queue-collection', default='reviewQueues')
+    parser.add_argument('--words', metavar='FILE',
+                        help="Take word positions from this file (and --ranking) instead of reading the collection")
+    parser.add_argument('--ranking', help='Ranking table for --words; file order without one')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='Words per queue (default: 50)')
+    parser.add_argument('--state', default=STATE_FILE, help='Local mirror of userWords and the scan cursor')
+    parser.add_argument('--full', action='store_true',
+                        help='Drop the mirror and rescan everything (picks up deleted documents)')
+    parser.add_argument('--overlap', type=float, default=300,
+                        help='Seconds before the cursor to read again on each run (default: 300)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_LIMIT)
+    parser.add_argument('--in-flight', type=int, default=4)
+    parser.add_argument('--emulator', metavar='HOST:PORT')
+    parser.add_argument('--fake', type=int, metavar='USERS',
+                        help='Run against an in-process fake store with this many users')
+    parser.add_argument('--fake-words-per-user', type=int, default=10)
+    parser.add_argument('--fake-latency', type=float, default=0.01)
+    parser.add_argument('--fake-changes', type=int, default=0, metavar='DOCS',
+                        help='After the first pass, change this many fake documents and run again')
+    args = parser.parse_args()
+
+    batch_size = min(args.batch_size, BATCH_LIMIT)
+    if args.fake:
+        start = time.perf_counter()
+        source, words_source = fake_store(args.fake, args.fake_words_per_user)
+        print(f"Fake store: {args.fake} users, {len(source.docs)} userWords documents "
+              f"({time.perf_counter() - start:.1f}s to build)")
+        source.latency = args.fake_latency
+        sink = MemorySink(latency=args.fake_latency)
+        state = ReviewState(':memory:')
+    else:
+        db = init_firestore(emulator=args.emulator)
+        source = FirestoreSource(db, args.collection)
+        words_source = FirestoreSource(db, args.words_collection)
+        sink = FirestoreSink(db, args.queue_collection)
+        state = ReviewState(args.state)
+        if args.full:
+            state.reset()
+
+    if args.words:
+        positions = {doc_id: (difficulties.index(doc['difficulty']), doc['index'])
+                     for doc_id, doc in build_docs(load_words(args.words), load_ranking(args.ranking))}
+    else:
+        positions = load_positions(words_source.iter_range())
+    print(f"{len(positions)} words with a position")
+
+    runs = [update_queues(source, state, positions, sink, args.queue_size, args.overlap, batch_size, args.in_flight)]
+    if args.fake and args.fake_changes:
+        touch_fake(source, args.fake_changes)
+        print(f"\nChanged {args.fake_changes} documents; running again")
+        runs.append(update_queues(source, state, positions, sink, args.queue_size, args.overlap, batch_size,
+                                  args.in_flight))
+    state.close()
+
+    for run in runs:
+        print(f"{run['written']} queues written in {run['seconds']:.1f}s "
+              f"({run['scanned']} documents scanned in {run['scan_seconds']:.1f}s)")
+    if runs[-1]['failed']:
+        print(f"{len(runs[-1]['failed'])} batches failed; their users stay queued for the next run.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+
+from journal import read_records, write_jsonl, write_records
+
+# Content-addressed snapshots of processed_words.json. Every entry is stored
+# once, zlib-compressed and keyed by its hash, in a SQLite object table (one
+# file rather than thousands of tiny ones). A snapshot's manifest
+# lists chunks of entry hashes, and the chunks are objects too. Chunk
+# boundaries depend on the entries' hashes, not their positions, so an insert
+# or delete only changes the chunks around it. The cost of a snapshot grows
+# with what changed since the last one, not with the size of the corpus.
+
+STORE_DIR = 'snapshots'
+# Average number of entries per manifest chunk
+CHUNK_AVERAGE = 64
+
+
+def encode_entry(entry):
+    # Keeps the key order so a restore reproduces the original layout
+    return json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def is_ascii_file(file_path, chunk_size=1 << 20):
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if not chunk.isascii():
+                return False
+    return True
+
+
+def object_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_time(value):
+    # A Unix timestamp or an ISO date/time such as 2024-10-14T09:30
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class SnapshotStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.manifests_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'objects.sqlite'))
+        self.db.execute('CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, data BLOB NOT NULL)')
+
+    def close(self):
+        self.db.close()
+
+    def put(self, data):
+        # Returns (hash, bytes written); nothing is written if the object exists.
+        digest = object_hash(data)
+        if self.db.execute('SELECT 1 FROM objects WHERE hash = ?', (digest,)).fetchone():
+            return digest, 0
+        compressed = zlib.compress(data, 6)
+        self.db.execute('INSERT INTO objects (hash, data) VALUES (?, ?)', (digest, compressed))
+        return digest, len(compressed)
+
+    def get(self, digest):
+        row = self.db.execute('SELECT data FROM objects WHERE hash = ?', (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Object {digest} is missing")
+        data = zlib.decompress(row[0])
+        if object_hash(data) != digest:
+            raise ValueError(f"Object {digest} is corrupt")
+        return data
+
+    def snapshot(self, records, source, label=None, created_at=None, ensure_ascii=True):
+        # Stores `records` and returns the manifest, which includes how many
+        # objects and bytes were new.
+        created_at = time.time() if created_at is None else created_at
+        chunks = []
+        chunk = []
+        count = 0
+        new_objects = 0
+        new_bytes = 0
+
+        def close_chunk():
+            nonlocal new_objects, new_bytes
+            digest, written = self.put('\n'.join(chunk).encode('ascii'))
+            chunks.append(digest)
+            new_objects += written > 0
+            new_bytes += written
+            chunk.clear()
+
+        for record in records:
+            digest, written = self.put(encode_entry(record))
+            new_objects += written > 0
+            new_bytes += written
+            chunk.append(digest)
+            count += 1
+            if int(digest[:8], 16) % CHUNK_AVERAGE == 0:
+                close_chunk()
+        if chunk:
+            close_chunk()
+
+        # Objects must be durable before a manifest refers to them
+        self.db.commit()
+        root_hash = object_hash('\n'.join(chunks).encode('ascii'))
+        manifest = {
+            'id': f"{int(created_at)}-{root_hash[:12]}",
+            'created_at': created_at,
+            'source': source,
+            'label': label,
+            'count': count,
+            'format': 'jsonl' if source.endswith('.jsonl') else 'json',
+            'ensure_ascii': ensure_ascii,
+            'chunks': chunks,
+        }
+        latest = self.latest(source)
+        if latest is not None and latest['chunks'] == chunks and latest['format'] == manifest['format']:
+            return {**latest, 'new_objects': 0, 'new_bytes': 0, 'unchanged': True}
+
+        tmp_path = os.path.join(self.manifests_dir, f"{manifest['id']}.json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.manifests_dir, f"{manifest['id']}.json"))
+        return {**manifest, 'new_objects': new_objects, 'new_bytes': new_bytes}
+
+    def snapshot_file(self, file_path, label=None, created_at=None):
+        # Files written with ensure_ascii=False are the ones holding raw UTF-8
+        ensure_ascii = is_ascii_file(file_path)
+        return self.snapshot(read_records(file_path), os.path.basename(file_path), label, created_at, ensure_ascii)
+
+    def manifests(self, source=None):
+        # All manifests (of one source file, if given), oldest first
+        result = []
+        for path in glob.glob(os.path.join(self.manifests_dir, '*.json')):
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            if source is None or manifest['source'] == source:
+                result.append(manifest)
+        return sorted(result, key=lambda manifest: manifest['created_at'])
+
+    def latest(self, source=None):
+        manifests = self.manifests(source)
+        return manifests[-1] if manifests else None
+
+    def resolve(self, ref=None, at=None, source=None):
+        # A manifest by ID (or unique prefix), the latest one at or before the
+        # time `at`, or the latest overall.
+        manifests = self.manifests(source)
+        if ref is not None:
+            matches = [manifest for manifest in manifests if manifest['id'].startswith(ref)]
+            if len(matches) != 1:
+                raise KeyError(f"'{ref}' matches {len(matches)} snapshots")
+            return matches[0]
+        if at is not None:
+            manifests = [manifest for manifest in manifests if manifest['created_at'] <= at]
+        if not manifests:
+            raise KeyError('No snapshot found')
+        return manifests[-1]
+
+    def entries(self, manifest):
+        for chunk in manifest['chunks']:
+            for digest in self.get(chunk).decode('ascii').split('\n'):
+                yield json.loads(self.get(digest))
+
+    def restore(self, manifest, output_file):
+        if output_file.endswith('.jsonl'):
+            return write_jsonl(output_file, self.entries(manifest), ensure_ascii=manifest['ensure_ascii'])
+        return write_records(output_file, self.entries(manifest), ensure_ascii=manifest['ensure_ascii'])
+
+    def stats(self):
+        objects, stored = self.db.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM objects').fetchone()
+        return {'snapshots': len(self.manifests()), 'objects': objects, 'stored_bytes': stored,
+                'file_bytes': os.path.getsize(os.path.join(self.root, 'objects.sqlite'))}
+
+
+def bak_time(file_path):
+    match = re.search(r'\.bak\.(\d+)$', file_path)
+    return int(match.group(1)) if match else None
+
+
+def describe(manifest):
+    created = datetime.fromtimestamp(manifest['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+    label = f" [{manifest['label']}]" if manifest.get('label') else ''
+    return f"{manifest['id']}  {created}  {manifest['count']:>7} entries  {manifest['source']}{label}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicated snapshots of processed_words.json.')
+    parser.add_argument('--store', default=STORE_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    snapshot = subparsers.add_parser('snapshot', help='Snapshot a JSON or JSONL corpus')
+    snapshot.add_argument('file', nargs='?', default='processed_words.json')
+    snapshot.add_argument('--label')
+
+    list_parser = subparsers.add_parser('list', help='List snapshots, oldest first')
+    list_parser.add_argument('--source', help='Only snapshots of this file name')
+
+    restore = subparsers.add_parser('restore', help='Write a snapshot back out')
+    restore.add_argument('snapshot', nargs='?', help='Snapshot ID or prefix (default: latest)')
+    restore.add_argument('--at', help='Latest snapshot at or before this Unix time or ISO date/time')
+    restore.add_argument('--source', help='Only consider snapshots of this file name')
+    restore.add_argument('--output', default='processed_words.json')
+
+    import_bak = subparsers.add_parser('import-bak', help='Snapshot existing .bak copies, dated by their suffix')
+    import_bak.add_argument('files', nargs='*')
+
+    subparsers.add_parser('stats', help='Show how much space the store uses')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+    if args.command == 'snapshot':
+        manifest = store.snapshot_file(args.file, args.label)
+        if manifest.get('unchanged'):
+            print(f"{args.file} is unchanged since snapshot {manifest['id']}")
+        else:
+            print(f"Snapshot {manifest['id']}: {manifest['count']} entries, "
+                  f"{manifest['new_objects']} new objects ({manifest['new_bytes'] / 1024:.1f} KiB)")
+
+    elif args.command == 'list':
+        for manifest in store.manifests(args.source):
+            print(describe(manifest))
+
+    elif args.command == 'restore':
+        manifest = store.resolve(args.snapshot, parse_time(args.at) if args.at else None, args.source)
+        count = store.restore(manifest, args.output)
+        print(f"Restored {count} entries from {manifest['id']} to {args.output}")
+
+    elif args.command == 'import-bak':
+        files = args.files or glob.glob('processed_words.json.bak.*')
+        total = 0
+        new_bytes = 0
+        for file_path in sorted(files, key=lambda f: bak_time(f) or os.path.getmtime(f)):
+            created_at = bak_time(file_path) or os.path.getmtime(file_path)
+            manifest = store.snapshot_file(file_path, label='imported', created_at=created_at)
+            total += os.path.getsize(file_path)
+            new_bytes += manifest['new_bytes']
+            print(describe(manifest))
+        print(f"Imported {len(files)} backups ({total / 1e6:.1f} MB) into {new_bytes / 1e6:.1f} MB of new objects. "
+              f"The .bak files can be deleted once you have checked a restore.")
+
+    elif args.command == 'stats':
+        stats = store.stats()
+        print(f"{stats['snapshots']} snapshots, {stats['objects']} objects, "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB compressed ({stats['file_bytes'] / 1e6:.1f} MB on disk) "
+              f"in {args.store}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+# Local stand-ins for the remote services the scripts talk to, so they can be
+# exercised and benchmarked without network access or rate-limit risk.
+
+
+class ServerRateLimit:
+    def __init__(self, rate, retry_after=1):
+        self.rate = rate
+        self.retry_after = retry_after
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def fake_dictionary_entry(word, audio_base='https://example.invalid/audio'):
+    return [{
+        'word': word,
+        'phonetics': [{'text': f'/{word}/', 'audio': f'{audio_base}/{quote(word)}.mp3'}],
+        'meanings': [{
+            'partOfSpeech': 'noun',
+            'definitions': [{
+                'definition': f'A stub definition of {word}.',
+                'example': f'An example using {word}.',
+                'synonyms': [],
+                'antonyms': [],
+            }],
+            'synonyms': [f'{word}-like'],
+            'antonyms': [],
+        }],
+    }]
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # and delayed ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+AUDIO_LAST_MODIFIED = 'Mon, 14 Oct 2024 09:30:00 GMT'
+
+
+def fake_audio(name):
+    # MP3-looking bytes (an ID3 header) derived from the file name. Regional
+    # variants such as hello-uk.mp3 and hello-us.mp3 share one recording.
+    base = name.rsplit('.', 1)[0].split('-')[0]
+    return b'ID3\x04\x00\x00\x00\x00\x00\x00' + hashlib.sha256(base.encode('utf-8')).digest() * 64
+
+
+def send_audio(handler, name):
+    # GET /audio/<name>: names starting with "zz" are dead links (404) and
+    # with "html" a 200 error page. Answers conditional requests with 304.
+    server = handler.server
+    server.audio_requests += 1
+    if name.startswith('zz'):
+        handler.send_json(404, {'error': 'not found'})
+        return
+    if name.startswith('html'):
+        body = b'<html><body>This file has moved.</body></html>'
+        content_type = 'text/html'
+    else:
+        body = fake_audio(name)
+        content_type = 'audio/mpeg'
+    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+    if_none_match = handler.headers.get('If-None-Match')
+    if if_none_match == etag or (if_none_match is None
+                                 and handler.headers.get('If-Modified-Since') == AUDIO_LAST_MODIFIED):
+        server.not_modified += 1
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('ETag', etag)
+    handler.send_header('Last-Modified', AUDIO_LAST_MODIFIED)
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class DictionaryHandler(JSONHandler):
+    # Mimics dictionaryapi.dev: GET /api/v2/entries/en/<word>. Words starting
+    # with "zz" are unknown (404); requests beyond the configured rate get a
+    # 429 with Retry-After. Entries' audio links point back at this server's
+    # /audio/ files, so a scrape can be followed by an audio prefetch.
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/audio/'):
+            send_audio(self, unquote(self.path[len('/audio/'):]))
+            return
+        server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if not server.rate_limit.allow():
+            server.rate_limited += 1
+            self.send_json(429, {'title': 'Too Many Requests'},
+                           {'Retry-After': str(server.rate_limit.retry_after)})
+            return
+        word = unquote(self.path.rstrip('/').rsplit('/', 1)[-1])
+        if word.startswith('zz'):
+            self.send_json(404, {'title': 'No Definitions Found'})
+            return
+        self.send_json(200, fake_dictionary_entry(word, f"http://{self.headers.get('Host')}/audio"))
+
+
+class AudioHandler(JSONHandler):
+    # Audio file host on its own, see send_audio
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        send_audio(self, unquote(self.path.rstrip('/').rsplit('/', 1)[-1]))
+
+
+def fake_word_entry(word):
+    return {
+        'word': word,
+        'definition': f'A stub definition of {word}.',
+        'wordType': 'noun',
+        'examples': [f'The first example uses {word}.', f'A second {word} example.',
+                     f'Here is {word} a third time.'],
+        'synonyms': [f'{word}-like', f'{word}ish'],
+        'antonyms': [f'un{word}'],
+    }
+
+
+class OllamaHandler(JSONHandler):
+    # Mimics Ollama's POST /api/chat (non-streaming). Generation prompts get a
+    # word entry, of which `messy_rate` are wrapped in prose with a trailing
+    # comma (repairable) and `invalid_rate` are unusable. Verification prompts
+    # get "PASS", or a correction for `fail_rate` of them. Batched
+    # verification prompts get a JSON array with an item per entry, of which
+    # `invalid_rate` are left out. Each reply takes `latency` plus
+    # `entry_latency` per entry in the prompt, and at most `concurrency`
+    # prompts are worked on at once (like one GPU), the rest wait their turn.
+    GENERATE_RE = re.compile(r"for the word '(.+?)'\.")
+    VERIFY_RE = re.compile(r'^Word: (.*)$', re.MULTILINE)
+    BATCH_MARKER = 'JSON array with one object per entry'
+
+    def roll(self):
+        with self.server.lock:
+            return self.server.random.random()
+
+    def reply(self, prompt):
+        # Returns (content, number of entries in the prompt)
+        server = self.server
+        if self.BATCH_MARKER in prompt:
+            return self.batch_reply(self.VERIFY_RE.findall(prompt))
+        roll = self.roll()
+        match = self.GENERATE_RE.search(prompt)
+        if match:
+            word = match.group(1)
+            if roll < server.invalid_rate:
+                return f"I'm sorry, I can't describe '{word}'.", 1
+            content = json.dumps(fake_word_entry(word), indent=2)
+            if roll < server.invalid_rate + server.messy_rate:
+                return f"Here is the entry:\n```json\n{content[:-2]},\n}}\n```", 1
+            return content, 1
+        match = self.VERIFY_RE.search(prompt)
+        if match and roll < server.fail_rate:
+            word = match.group(1)
+            examples = fake_word_entry(word)['examples']
+            return (f"FAIL: Word: {word}\nDefinition: An improved definition of {word}.\nExamples:\n"
+                    + '\n'.join(f'{i}. {example}' for i, example in enumerate(examples, 1))), 1
+        return 'PASS', 1
+
+    def batch_reply(self, words):
+        server = self.server
+        items = []
+        for word in words:
+            roll = self.roll()
+            if roll < server.invalid_rate:
+                continue
+            if roll < server.invalid_rate + server.fail_rate:
+                items.append({'word': word, 'result': 'FAIL', 'definition': f'An improved definition of {word}.',
+                              'examples': fake_word_entry(word)['examples']})
+            else:
+                items.append({'word': word, 'result': 'PASS'})
+        content = json.dumps(items, indent=2)
+        if self.roll() < server.messy_rate:
+            content = f"Here are the results:\n```json\n{content[:-2]},\n]\n```"
+        return content, len(words)
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path.rstrip('/') != '/api/chat':
+            self.send_json(404, {'error': f'unknown endpoint {self.path}'})
+            return
+        prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        content, entries = self.reply(prompt)
+        delay = server.latency + server.entry_latency * entries
+        if delay:
+            with server.slots:
+                time.sleep(delay)
+        self.send_json(200, {
+            'model': request.get('model', 'stub'),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'done_reason': 'stop',
+            # Rough token counts (4 characters each), as Ollama reports them
+            'prompt_eval_count': len(prompt) // 4,
+            'eval_count': max(1, len(content) // 4),
+            'eval_duration': int(delay * 1e9),
+        })
+
+
+def start_server(handler, port=0, **attributes):
+    # Runs `handler` on a background thread. Returns the server; its URL is
+    # http://127.0.0.1:<server.server_port>.
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.rate_limited = 0
+    server.audio_requests = 0
+    server.not_modified = 0
+    for key, value in attributes.items():
+        setattr(server, key, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_dictionary_server(port=0, rate=0, retry_after=1, latency=0.0):
+    return start_server(DictionaryHandler, port, rate_limit=ServerRateLimit(rate, retry_after), latency=latency)
+
+
+def start_audio_server(port=0, latency=0.0):
+    return start_server(AudioHandler, port, latency=latency)
+
+
+def start_ollama_server(port=0, latency=0.0, messy_rate=0.0, invalid_rate=0.0, fail_rate=0.0, seed=0,
+                        entry_latency=0.0, concurrency=0):
+    # concurrency=0 answers every request in parallel
+    slots = threading.Semaphore(concurrency) if concurrency else contextlib.nullcontext()
+    return start_server(OllamaHandler, port, latency=latency, messy_rate=messy_rate, invalid_rate=invalid_rate,
+                        fail_rate=fail_rate, random=random.Random(seed), lock=threading.Lock(),
+                        entry_latency=entry_latency, slots=slots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stub of a remote service.')
+    subparsers = parser.add_subparsers(dest='service', required=True)
+
+    dictionary = subparsers.add_parser('dictionary', help='dictionaryapi.dev stand-in')
+    dictionary.add_argument('--port', type=int, default=8765)
+    dictionary.add_argument('--rate', type=float, default=0,
+                            help='Requests per second before answering 429 (0 = unlimited)')
+    dictionary.add_argument('--retry-after', type=int, default=1)
+    dictionary.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds to wait before answering each request')
+
+    audio = subparsers.add_parser('audio', help='Audio file host with ETag/Last-Modified support')
+    audio.add_argument('--port', type=int, default=8766)
+    audio.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds to wait before answering each request')
+
+    llm = subparsers.add_parser('ollama', help='Ollama /api/chat stand-in')
+    llm.add_argument('--port', type=int, default=11435)
+    llm.add_argument('--latency', type=float, default=0.0,
+                     help='Seconds to wait before answering each request')
+    llm.add_argument('--entry-latency', type=float, default=0.0,
+                     help='Extra seconds per entry in the prompt')
+    llm.add_argument('--concurrency', type=int, default=0,
+                     help='Prompts answered at once, the rest queue (0 = unlimited)')
+    llm.add_argument('--messy-rate', type=float, default=0.0,
+                     help='Fraction of entries returned with prose and a trailing comma')
+    llm.add_argument('--invalid-rate', type=float, default=0.0,
+                     help='Fraction of replies (or batched items) that contain no entry at all')
+    llm.add_argument('--fail-rate', type=float, default=0.0,
+                     help='Fraction of verification prompts answered with a correction')
+
+    args = parser.parse_args()
+    if args.service == 'dictionary':
+        server = start_dictionary_server(args.port, args.rate, args.retry_after, args.latency)
+        print(f"Dictionary stub on http://127.0.0.1:{server.server_port}/api/v2/entries/en")
+    elif args.service == 'audio':
+        server = start_audio_server(args.port, args.latency)
+        print(f"Audio stub on http://127.0.0.1:{server.server_port}/audio/<name>.mp3")
+    elif args.service == 'ollama':
+        server = start_ollama_server(args.port, args.latency, args.messy_rate, args.invalid_rate, args.fail_rate,
+                                     entry_latency=args.entry_latency, concurrency=args.concurrency)
+        print(f"Ollama stub on http://127.0.0.1:{server.server_port} (set OLLAMA_HOST to use it)")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import re
+
+TOKEN_RE = re.compile(r'\b\w+\b')
+LEET_TOKEN_RE = re.compile(r'[\w@$!|+]+')
+# Text without any of these has nothing for leet normalization to change.
+LEET_HINT_RE = re.compile(r'[0-9@$|+]|!\w')
+LEET_MAP = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't',
+    '@': 'a', '$': 's', '!': 'i', '|': 'l', '+': 't',
+})
+
+
+def normalize_leet(text):
+    return text.translate(LEET_MAP)
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class SwearMatcher:
+    # Compiles the swear list once: single-token entries go into a hash map,
+    # multi-word / punctuated entries ("ass-fucker", "s.o.b.") into one
+    # literal alternation regex, which finds every phrase occurrence in a
+    # single C-level pass (boundaries are checked only on candidates).
+    # With leet=True, "5h1t"-style spellings in the text are normalized before
+    # lookup as well.
+    def __init__(self, swears, leet=False):
+        self.leet = leet
+        self.tokens = {}
+        self.phrases = {}
+        entries = [(swear.lower(), swear) for swear in swears]
+        if leet:
+            # Literal spellings take precedence over their normalized forms.
+            entries += [(normalize_leet(swear.lower()), swear) for swear in swears]
+        for key, swear in entries:
+            if TOKEN_RE.fullmatch(key):
+                self.tokens.setdefault(key, swear)
+            else:
+                self.phrases.setdefault(key, swear)
+
+        self.token_keys = frozenset(self.tokens)
+        self.phrase_re = None
+        if self.phrases:
+            # Longest first so "f u c k e r" wins over "f u c k".
+            ordered = sorted(self.phrases, key=len, reverse=True)
+            self.phrase_re = re.compile('|'.join(re.escape(p) for p in ordered))
+
+    def _match_phrase(self, text):
+        pos = 0
+        while True:
+            match = self.phrase_re.search(text, pos)
+            if not match:
+                return None
+            start, end = match.span()
+            # Word boundaries only where the phrase itself starts or ends with
+            # a word character, so "s.o.b." still matches before punctuation.
+            if not (is_word_char(text[start]) and start > 0 and is_word_char(text[start - 1])) and \
+                    not (is_word_char(text[end - 1]) and end < len(text) and is_word_char(text[end])):
+                return self.phrases[match.group(0)]
+            pos = start + 1
+
+    def find(self, text):
+        text = text.lower()
+        tokens = TOKEN_RE.findall(text)
+        if not self.token_keys.isdisjoint(tokens):
+            for token in tokens:
+                swear = self.tokens.get(token)
+                if swear:
+                    return swear
+        if self.leet and LEET_HINT_RE.search(text):
+            for token in LEET_TOKEN_RE.findall(text):
+                # Numbers like "455" aren't disguised words; a disguise needs
+                # a letter or one of the symbols ("@$$")
+                if token.isdigit():
+                    continue
+                swear = self.tokens.get(normalize_leet(token.strip('!')))
+                if swear:
+                    return swear
+        if self.phrase_re is not None:
+            return self._match_phrase(text)
+        return None
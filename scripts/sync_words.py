@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from firestore_io import (BATCH_LIMIT, FirestoreSink, FirestoreSource, MemorySink,
+                          init_firestore, write_batches)
+from uploadToDb import build_docs, iter_batches, load_ranking, load_words
+
+# Pushes only what changed in processed_words.json since the last sync, using
+# a local manifest of document ID -> content hash.
+
+
+def content_hash(doc):
+    encoded = json.dumps(doc, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def load_manifest(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['docs']
+    return {}
+
+
+def save_manifest(file_path, collection, docs):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'collection': collection, 'updated_at': time.time(), 'docs': docs}, f)
+    os.replace(tmp_path, file_path)
+
+
+def manifest_from_source(source):
+    # Hashes what is actually stored, e.g. after a plain uploadToDb run.
+    return {doc_id: content_hash(data) for page in source.iter_range() for doc_id, data in page}
+
+
+def diff(desired, manifest):
+    # Returns (added, changed, deleted) document IDs.
+    added = []
+    changed = []
+    for doc_id, doc in desired.items():
+        known = manifest.get(doc_id)
+        if known is None:
+            added.append(doc_id)
+        elif known != content_hash(doc):
+            changed.append(doc_id)
+    deleted = [doc_id for doc_id in manifest if doc_id not in desired]
+    return added, changed, deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write only added, changed or deleted words to Firestore.')
+    parser.add_argument('--input', default='processed_words.json')
+    parser.add_argument('--ranking',
+                        help='Ranking table from rank_words.py (e.g. word_ranking.csv); file order without one')
+    parser.add_argument('--collection', default='words')
+    parser.add_argument('--manifest', default='sync_manifest.json',
+                        help='Not used with --fake, whose store starts empty on every run')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would be written without writing anything')
+    parser.add_argument('--report', help='Also write the diff as JSON to this file')
+    parser.add_argument('--rebuild-manifest', action='store_true',
+                        help='Rebuild the manifest by reading the collection before diffing')
+    parser.add_argument('--in-flight', type=int, default=4)
+    parser.add_argument('--emulator', metavar='HOST:PORT',
+                        help='Sync against a Firestore emulator instead of the live project')
+    parser.add_argument('--fake', action='store_true',
+                        help='Sync against an in-process fake backend')
+    args = parser.parse_args()
+
+    if args.fake:
+        backend = MemorySink()
+        sink = source = backend
+    else:
+        db = init_firestore(emulator=args.emulator)
+        sink = FirestoreSink(db, args.collection)
+        source = FirestoreSource(db, args.collection)
+
+    desired = dict(build_docs(load_words(args.input), load_ranking(args.ranking)))
+    # The fake store only lives for this run, so its manifest does too
+    if args.rebuild_manifest:
+        print(f"Reading {args.collection} to rebuild the manifest...")
+        manifest = manifest_from_source(source)
+    else:
+        manifest = {} if args.fake else load_manifest(args.manifest)
+
+    def save():
+        if not args.fake:
+            save_manifest(args.manifest, args.collection, manifest)
+
+    added, changed, deleted = diff(desired, manifest)
+    print(f"{len(desired)} local words, {len(manifest)} in manifest: "
+          f"{len(added)} added, {len(changed)} changed, {len(deleted)} deleted")
+    for label, ids in (('added', added), ('changed', changed), ('deleted', deleted)):
+        if ids:
+            print(f"  {label}: {', '.join(ids[:10])}{' ...' if len(ids) > 10 else ''}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'added': added, 'changed': changed, 'deleted': deleted}, f, indent=2)
+        print(f"Diff written to {args.report}")
+
+    if args.dry_run:
+        print("Dry run: nothing written.")
+        return
+
+    if args.rebuild_manifest:
+        save()
+
+    ops = [(doc_id, desired[doc_id]) for doc_id in added + changed] + [(doc_id, None) for doc_id in deleted]
+    commits = 0
+    written = 0
+
+    def on_commit(batch_number, batch_ops):
+        nonlocal commits, written
+        written += len(batch_ops)
+        for doc_id, data in batch_ops:
+            if data is None:
+                manifest.pop(doc_id, None)
+            else:
+                manifest[doc_id] = content_hash(data)
+        commits += 1
+        if commits % 20 == 0:
+            save()
+
+    failed = write_batches(sink, iter_batches(iter(ops), BATCH_LIMIT), max_in_flight=args.in_flight,
+                           on_commit=on_commit)
+    save()
+    print(f"Wrote {written} of {len(ops)} changes in {commits} batches.")
+    if failed:
+        print(f"{len(failed)} batches failed; their documents will be retried on the next sync.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+from entry_checks import MIN_CONFIDENCE, check_entries, flagged_indexes
+
+
+def entry(**fields):
+    base = {
+        'word': 'river',
+        'definition': 'a large natural stream of water',
+        'wordType': 'noun',
+        'examples': ['The river was wide.', 'We swam in the river.', 'Rivers flow to the sea.'],
+        'synonyms': ['stream'],
+        'antonyms': [],
+    }
+    return {**base, **fields}
+
+
+def test_clean_entry_passes():
+    checks = check_entries([entry()])
+    assert checks[0] == (1.0, [])
+    assert flagged_indexes(checks) == set()
+
+
+def test_single_example_without_the_word_is_flagged():
+    examples = ['The river was wide.', 'We swam in the river.', 'The water was cold.']
+    checks = check_entries([entry(examples=examples)])
+    score, issues = checks[0]
+    assert issues == ['word_not_in_example']
+    assert score < MIN_CONFIDENCE
+    assert flagged_indexes(checks) == {0}
+
+
+def test_inflected_forms_count_as_using_the_word():
+    cases = [('carry', 'She carried the bags.'), ('make', 'They are making bread.'),
+             ('stop', 'The bus stopped here.'), ('happy', 'He smiled happily.'), ('go', 'She goes home.')]
+    for word, example in cases:
+        checks = check_entries([entry(word=word, examples=[example] * 3)])
+        assert 'word_not_in_example' not in checks[0][1], word
+
+
+def test_longer_words_sharing_a_prefix_dont_count():
+    cases = [('art', 'The artist painted a mural.'), ('a', 'She ate an apple.'),
+             ('in', 'We stayed inside.'), ('an', 'Bread and butter.'), ('car', 'He was careful.')]
+    for word, example in cases:
+        _, issues = check_entries([entry(word=word, examples=[example, f'Say {word} twice.', example])])[0]
+        assert issues.count('word_not_in_example') == 2, word
@@ -0,0 +1,18 @@
+from swear_matcher import SwearMatcher
+
+
+def test_leet_spelling_is_found():
+    matcher = SwearMatcher(['ass', 'shit'], leet=True)
+    assert matcher.find('what a 5h1t day') == 'shit'
+    assert matcher.find('you @$$') == 'ass'
+
+
+def test_leet_ignores_plain_numbers():
+    matcher = SwearMatcher(['ass'], leet=True)
+    assert matcher.find('founded in 455 BC') is None
+    assert matcher.find('scored 455 points, 4 55 in total') is None
+
+
+def test_leet_still_reads_digits_inside_words():
+    matcher = SwearMatcher(['ass'], leet=True)
+    assert matcher.find('a55 kicked') == 'ass'
@@ -1,41 +1,170 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-import json
+import argparse
+import csv
+import os
+import time
+from itertools import islice
 
-# Initialize Firebase
-cred = credentials.Certificate('../serviceAccountKey.json')
-firebase_admin.initialize_app(cred)
+from firestore_io import (BATCH_LIMIT, BatchCheckpoint, FirestoreSink, MemorySink,
+                          init_firestore, word_doc_id, write_batches)
+from journal import read_records
 
-# Access Firestore
-db = firestore.client()
+difficulties = ['beginner', 'intermediate', 'advanced', 'expert']
 
-# Load JSON data
-with open('processed_words.json') as json_file:
-    words_data = json.load(json_file)
 
-# Upload words to Firestore
-words_ref = db.collection('words')
+def load_words(file_path):
+    # Load a JSON array or JSON Lines, keeping only the first entry for each
+    # word so that deterministic document IDs don't collide.
+    seen = set()
+    unique = []
+    for word in read_records(file_path):
+        key = word_doc_id(word['word'])
+        if key not in seen:
+            seen.add(key)
+            unique.append(word)
+    return unique
 
-idx = 0
-didx = 0
-difficulties = ['beginner', 'intermediate', 'advanced', 'expert']
 
-for word in words_data:
-    word_doc = word.copy()
-    word_doc["index"] = idx
-    word_doc["difficulty"] = difficulties[didx]
-    words_ref.add(word_doc)
+def load_ranking(file_path=None):
+    # Returns {docId: (difficulty, index)} from rank_words.py's table, or None
+    # when no table is given and positions come from file order. The table is
+    # only used when asked for, so a stale one lying around isn't picked up.
+    if not file_path:
+        return None
+    with open(file_path, newline='', encoding='utf-8') as f:
+        return {row['docId']: (row['difficulty'], int(row['index'])) for row in csv.DictReader(f)}
 
-    if idx == 9000:
-        if didx == 3:
-            idx += 1
+
+def input_fingerprint(*file_paths):
+    # Size and mtime of each input; None for one that doesn't exist
+    fingerprint = []
+    for file_path in file_paths:
+        if file_path and os.path.exists(file_path):
+            stat = os.stat(file_path)
+            fingerprint.append({'path': file_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
         else:
-            didx += 1
-            idx = 0
+            fingerprint.append(None)
+    return fingerprint
+
+
+def assign_positions(words_data, ranking=None):
+    # Yields (word, difficulty, index), from the ranking table when given.
+    # Otherwise by file order: 9001 words per difficulty, with any overflow
+    # continuing in 'expert'.
+    if ranking is not None:
+        # Words the table lacks go after its last 'expert' word, in file order
+        missing = [word['word'] for word in words_data if word_doc_id(word['word']) not in ranking]
+        if missing:
+            print(f"Warning: {len(missing)} words are missing from the ranking table and were put at the end "
+                  f"({', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}); re-run rank_words.py")
+        next_index = max((index for difficulty, index in ranking.values() if difficulty == 'expert'), default=-1) + 1
+        for word in words_data:
+            position = ranking.get(word_doc_id(word['word']))
+            if position is None:
+                position = ('expert', next_index)
+                next_index += 1
+            yield word, position[0], position[1]
+        return
+
+    idx = 0
+    didx = 0
+    for word in words_data:
+        yield word, difficulties[didx], idx
+
+        if idx == 9000:
+            if didx == 3:
+                idx += 1
+            else:
+                didx += 1
+                idx = 0
+        else:
+            idx += 1
+
+
+def build_docs(words_data, ranking=None):
+    for word, difficulty, index in assign_positions(words_data, ranking):
+        word_doc = word.copy()
+        word_doc["index"] = index
+        word_doc["difficulty"] = difficulty
+        yield word_doc_id(word['word']), word_doc
+
+
+def iter_batches(docs, batch_size, skip_batches=0):
+    docs = iter(docs)
+    batch_number = 0
+    while True:
+        ops = list(islice(docs, batch_size))
+        if not ops:
+            return
+        if batch_number >= skip_batches:
+            yield batch_number, ops
+        batch_number += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upload processed words to Firestore.')
+    parser.add_argument('--input', default='processed_words.json')
+    parser.add_argument('--collection', default='words')
+    parser.add_argument('--ranking',
+                        help='Ranking table from rank_words.py (e.g. word_ranking.csv); file order without one')
+    parser.add_argument('--batch-size', type=int, default=BATCH_LIMIT,
+                        help=f'Writes per batch (max {BATCH_LIMIT})')
+    parser.add_argument('--in-flight', type=int, default=4,
+                        help='Batches committed concurrently (default: 4)')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='Retries with backoff for a failed batch (default: 5)')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the checkpoint and upload every batch')
+    parser.add_argument('--emulator', metavar='HOST:PORT',
+                        help='Write to a Firestore emulator instead of the live project')
+    parser.add_argument('--fake', action='store_true',
+                        help='Write to an in-process fake sink (for throughput tests)')
+    parser.add_argument('--fake-latency', type=float, default=0.05,
+                        help='Simulated commit latency for --fake, in seconds')
+    args = parser.parse_args()
+
+    batch_size = min(args.batch_size, BATCH_LIMIT)
+    checkpoint_file = None if args.fake else 'upload_progress.json'
+    checkpoint = BatchCheckpoint(checkpoint_file, batch_size, input_fingerprint(args.input, args.ranking))
+    if args.restart:
+        checkpoint.committed = 0
+
+    if args.fake:
+        sink = MemorySink(latency=args.fake_latency)
+    else:
+        # Access Firestore
+        db = init_firestore(emulator=args.emulator)
+        sink = FirestoreSink(db, args.collection)
+
+    words_data = load_words(args.input)
+    ranking = load_ranking(args.ranking)
+    print(f"Positions from {args.ranking or 'file order'}")
+    total_batches = (len(words_data) + batch_size - 1) // batch_size
+    print(f"Uploading {len(words_data)} words in {total_batches} batches "
+          f"(resuming after batch {checkpoint.committed})")
+
+    uploaded = 0
+    start = time.perf_counter()
+
+    def on_commit(batch_number, ops):
+        nonlocal uploaded
+        uploaded += len(ops)
+        checkpoint.mark(batch_number)
+        checkpoint.save()
+        first = ops[0][1]
+        print(f"Batch {batch_number + 1}/{total_batches} committed: "
+              f"{first['difficulty']}, {first['index']}, {first['word']} ...")
+
+    failed = write_batches(sink, iter_batches(build_docs(words_data, ranking), batch_size, checkpoint.committed),
+                           max_in_flight=args.in_flight, retries=args.retries, on_commit=on_commit)
+
+    elapsed = time.perf_counter() - start
+    print(f"Uploaded {uploaded} words in {elapsed:.1f}s ({uploaded / max(elapsed, 1e-9):.0f} words/s)")
+    if failed:
+        print(f"{len(failed)} batches failed: {failed}. Re-run to resume from batch {checkpoint.committed}.")
     else:
-        idx += 1
-    
-    print(f"{difficulties[didx]}, {idx}, {word['word']}")
+        checkpoint.clear()
+        print('Upload completed successfully.')
+
 
-print('Upload completed successfully.')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+
+from journal import read_records, write_records
+
+# SQLite-backed corpus: one row per word keyed by the lowercased word, with
+# indexes on wordType and difficulty and full-text search over the word, its
+# definition and examples. Lookups and edits touch single rows instead of
+# parsing and rewriting the whole processed_words.json.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS words (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    difficulty TEXT,
+    difficulty_index INTEGER,
+    -- Derived from the entry JSON rather than stored twice
+    word TEXT GENERATED ALWAYS AS (json_extract(entry, '$.word')) VIRTUAL,
+    word_type TEXT GENERATED ALWAYS AS (json_extract(entry, '$.wordType')) VIRTUAL,
+    definition TEXT GENERATED ALWAYS AS (json_extract(entry, '$.definition')) VIRTUAL,
+    examples TEXT GENERATED ALWAYS AS (json_extract(entry, '$.examples')) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS words_position ON words (position);
+CREATE INDEX IF NOT EXISTS words_word_type ON words (word_type);
+CREATE INDEX IF NOT EXISTS words_difficulty ON words (difficulty, difficulty_index);
+CREATE VIRTUAL TABLE IF NOT EXISTS words_fts USING fts5(
+    word, definition, examples, content='words', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS words_fts_insert AFTER INSERT ON words BEGIN
+    INSERT INTO words_fts (rowid, word, definition, examples)
+    VALUES (new.rowid, new.word, new.definition, new.examples);
+END;
+CREATE TRIGGER IF NOT EXISTS words_fts_delete AFTER DELETE ON words BEGIN
+    INSERT INTO words_fts (words_fts, rowid, word, definition, examples)
+    VALUES ('delete', old.rowid, old.word, old.definition, old.examples);
+END;
+CREATE TRIGGER IF NOT EXISTS words_fts_update AFTER UPDATE ON words BEGIN
+    INSERT INTO words_fts (words_fts, rowid, word, definition, examples)
+    VALUES ('delete', old.rowid, old.word, old.definition, old.examples);
+    INSERT INTO words_fts (rowid, word, definition, examples)
+    VALUES (new.rowid, new.word, new.definition, new.examples);
+END;
+'''
+
+INSERT = 'INSERT OR IGNORE INTO words (key, position, entry) VALUES (?, ?, ?)'
+UPSERT = '''
+INSERT INTO words (key, position, entry) VALUES (?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET entry = excluded.entry
+'''
+
+
+def encode(entry):
+    return json.dumps(entry, ensure_ascii=False)
+
+
+class WordStore:
+    def __init__(self, file_path='words.sqlite'):
+        self.file_path = file_path
+        self.db = sqlite3.connect(file_path)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+
+    def __contains__(self, word):
+        return self.db.execute('SELECT 1 FROM words WHERE key = ?', (word.lower(),)).fetchone() is not None
+
+    def keys(self):
+        return {key for key, in self.db.execute('SELECT key FROM words')}
+
+    def import_records(self, records, replace=True):
+        # Loads entries in one transaction, keeping their order. With
+        # `replace` the store becomes exactly `records` (the first entry of a
+        # repeated word wins, as in uploadToDb); otherwise entries are upserted.
+        # Returns the number of words stored or upserted.
+        statement = INSERT if replace else UPSERT
+        with self.db:
+            if replace:
+                self.db.execute('DELETE FROM words')
+            position = self.db.execute('SELECT COALESCE(MAX(position), -1) FROM words').fetchone()[0]
+            count = 0
+            rows = []
+            for entry in records:
+                position += 1
+                count += 1
+                rows.append((entry['word'].lower(), position, encode(entry)))
+                if len(rows) >= 5000:
+                    self.db.executemany(statement, rows)
+                    rows = []
+            self.db.executemany(statement, rows)
+        return len(self) if replace else count
+
+    def iter_entries(self, word_type=None, difficulty=None, batch_size=1000):
+        # Streams entries in corpus order (or by index within a difficulty)
+        query = 'SELECT entry FROM words'
+        conditions = []
+        params = []
+        if word_type is not None:
+            conditions.append('word_type = ?')
+            params.append(word_type)
+        if difficulty is not None:
+            conditions.append('difficulty = ?')
+            params.append(difficulty)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY difficulty_index' if difficulty is not None else ' ORDER BY position'
+        cursor = self.db.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for entry, in rows:
+                yield json.loads(entry)
+
+    def get(self, word):
+        row = self.db.execute('SELECT entry FROM words WHERE key = ?', (word.lower(),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, entry):
+        # Inserts a new word at the end, or replaces an existing one in place
+        with self.db:
+            position = self.db.execute('SELECT COALESCE(MAX(position), -1) + 1 FROM words').fetchone()[0]
+            self.db.execute(UPSERT, (entry['word'].lower(), position, encode(entry)))
+
+    def update(self, word, fields):
+        # Partial update; returns the new entry, or None if the word is unknown
+        entry = self.get(word)
+        if entry is None:
+            return None
+        entry.update(fields)
+        key = word.lower()
+        with self.db:
+            if entry['word'].lower() != key:
+                raise ValueError(f"Can't rename '{word}' to '{entry['word']}' with an update")
+            self.db.execute('UPDATE words SET entry = ? WHERE key = ?', (encode(entry), key))
+        return entry
+
+    def delete(self, word):
+        with self.db:
+            return self.db.execute('DELETE FROM words WHERE key = ?', (word.lower(),)).rowcount > 0
+
+    def search(self, query, limit=20):
+        # FTS5 query syntax, e.g. 'river', 'defin*', '"quiet river"', 'definition: bank'
+        rows = self.db.execute('SELECT words.entry FROM words_fts JOIN words ON words.rowid = words_fts.rowid '
+                               'WHERE words_fts MATCH ? ORDER BY rank LIMIT ?', (query, limit))
+        return [json.loads(entry) for entry, in rows]
+
+    def set_ranking(self, ranking):
+        # `ranking` maps the lowercased word to (difficulty, index), e.g. from
+        # rank_words.py's table. Returns how many words were positioned.
+        with self.db:
+            self.db.execute('UPDATE words SET difficulty = NULL, difficulty_index = NULL')
+            return self.db.executemany('UPDATE words SET difficulty = ?, difficulty_index = ? WHERE key = ?',
+                                       [(d, i, key) for key, (d, i) in ranking.items()]).rowcount
+
+    def counts(self, column):
+        return dict(self.db.execute(f'SELECT {column}, COUNT(*) FROM words GROUP BY {column} ORDER BY 2 DESC'))
+
+
+def load_ranking_by_word(file_path):
+    with open(file_path, newline='', encoding='utf-8') as f:
+        return {row['word'].lower(): (row['difficulty'], int(row['index'])) for row in csv.DictReader(f)}
+
+
+def parse_value(value):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query and edit the SQLite word store.')
+    parser.add_argument('--db', default='words.sqlite')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Load a JSON or JSONL corpus, replacing the store')
+    import_parser.add_argument('file', nargs='?', default='processed_words.json')
+    import_parser.add_argument('--append', action='store_true', help='Add or replace words, keep the rest')
+    import_parser.add_argument('--ranking', help="rank_words.py's table, to fill in difficulty and index")
+
+    export_parser = subparsers.add_parser('export', help='Write the store out as JSON (or JSONL)')
+    export_parser.add_argument('file', nargs='?', default='processed_words.json')
+    export_parser.add_argument('--ascii', action='store_true', help='Escape non-ASCII characters')
+
+    get_parser = subparsers.add_parser('get')
+    get_parser.add_argument('word')
+
+    update_parser = subparsers.add_parser('update', help='Set fields, e.g. definition="..." or examples=\'[...]\'')
+    update_parser.add_argument('word')
+    update_parser.add_argument('fields', nargs='+', metavar='FIELD=VALUE')
+
+    delete_parser = subparsers.add_parser('delete')
+    delete_parser.add_argument('word')
+
+    search_parser = subparsers.add_parser('search', help='Full-text search of words, definitions and examples')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=20)
+
+    list_parser = subparsers.add_parser('list')
+    list_parser.add_argument('--word-type')
+    list_parser.add_argument('--difficulty')
+    list_parser.add_argument('--limit', type=int, default=50)
+
+    subparsers.add_parser('stats')
+    args = parser.parse_args()
+
+    with WordStore(args.db) as store:
+        if args.command == 'import':
+            start = time.perf_counter()
+            count = store.import_records(read_records(args.file), replace=not args.append)
+            print(f"Imported {count} words from {args.file} into {args.db} in {time.perf_counter() - start:.1f}s")
+            if args.ranking:
+                print(f"Positioned {store.set_ranking(load_ranking_by_word(args.ranking))} words")
+
+        elif args.command == 'export':
+            count = write_records(args.file, store.iter_entries(), ensure_ascii=args.ascii)
+            print(f"Exported {count} words to {args.file}")
+
+        elif args.command == 'get':
+            entry = store.get(args.word)
+            print(json.dumps(entry, indent=2, ensure_ascii=False) if entry else f"'{args.word}' not found")
+
+        elif args.command == 'update':
+            fields = {}
+            for item in args.fields:
+                name, _, value = item.partition('=')
+                fields[name] = parse_value(value)
+            entry = store.update(args.word, fields)
+            print(json.dumps(entry, indent=2, ensure_ascii=False) if entry else f"'{args.word}' not found")
+
+        elif args.command == 'delete':
+            print(f"Deleted '{args.word}'" if store.delete(args.word) else f"'{args.word}' not found")
+
+        elif args.command == 'search':
+            for entry in store.search(args.query, args.limit):
+                print(f"{entry['word']}: {entry.get('definition')}")
+
+        elif args.command == 'list':
+            for i, entry in enumerate(store.iter_entries(args.word_type, args.difficulty)):
+                if i >= args.limit:
+                    break
+                print(f"{entry['word']}: {entry.get('definition')}")
+
+        elif args.command == 'stats':
+            print(f"{len(store)} words in {args.db} ({os.path.getsize(args.db) / 1e6:.1f} MB)")
+            print(f"By wordType: {store.counts('word_type')}")
+            print(f"By difficulty: {store.counts('difficulty')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+
+# Shared queue for genDB runs spread over several hosts. The word list is cut
+# into ranges; a worker leases a range for `lease_seconds`, renews the lease
+# while it works and reports the range's entries back in one transaction. A
+# worker that dies simply stops renewing, and its range is handed to the next
+# worker that asks once the lease expires. Results are keyed by word, so a
+# range finished twice (a slow worker whose lease was reclaimed) stores each
+# entry once.
+#
+# The store is a single SQLite file. Hosts share it over a network file
+# system that supports locking, or run workers on the host that owns it.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS words (position INTEGER PRIMARY KEY, word TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ranges (
+    id INTEGER PRIMARY KEY,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    leases INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ranges_status ON ranges (status, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS failures (position INTEGER PRIMARY KEY, word TEXT NOT NULL, error TEXT, worker TEXT);
+'''
+
+QUEUE_FILE = 'work_queue.sqlite'
+RANGE_SIZE = 20
+LEASE_SECONDS = 300
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, file_path=QUEUE_FILE, lease_seconds=LEASE_SECONDS):
+        self.file_path = file_path
+        self.lease_seconds = lease_seconds
+        # One connection per thread. No WAL: it needs shared memory, which
+        # network file systems don't provide. Writers wait on the lock.
+        self.db = sqlite3.connect(file_path, timeout=60, isolation_level=None)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't
+        # both read a range as free and then both claim it.
+        return Transaction(self.db)
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def fill(self, words, range_size=RANGE_SIZE, skip=(), source=None):
+        # Replaces the queue with `words` (skipping lowercased words in
+        # `skip`), cut into ranges of at most `range_size` words to generate.
+        # Unmerged results are dropped, so merge them first. Returns the
+        # number of ranges.
+        with self.transaction():
+            for table in ('words', 'ranges', 'results', 'failures', 'meta'):
+                self.db.execute(f'DELETE FROM {table}')
+            todo = []
+            seen = set(skip)
+            for position, word in enumerate(words):
+                if word.lower() not in seen:
+                    seen.add(word.lower())
+                    todo.append((position, word))
+            self.db.executemany('INSERT INTO words (position, word) VALUES (?, ?)', todo)
+            ranges = [(todo[i][0], todo[min(i + range_size, len(todo)) - 1][0] + 1)
+                      for i in range(0, len(todo), range_size)]
+            self.db.executemany('INSERT INTO ranges (start, end) VALUES (?, ?)', ranges)
+            self.db.execute('INSERT INTO meta (key, value) VALUES (?, ?)', ('source', json.dumps(source)))
+            self.db.execute('INSERT INTO meta (key, value) VALUES (?, ?)', ('created_at', json.dumps(time.time())))
+        return len(ranges)
+
+    def lease(self, worker):
+        # Returns (range_id, [(position, word), ...]) for a pending range or
+        # one whose lease has expired, or None when nothing is left to lease.
+        now = time.time()
+        with self.transaction():
+            row = self.db.execute(
+                "SELECT id, start, end FROM ranges WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            range_id, start, end = row
+            self.db.execute("UPDATE ranges SET status = 'leased', worker = ?, lease_expires = ?, "
+                            "leases = leases + 1 WHERE id = ?", (worker, now + self.lease_seconds, range_id))
+            words = self.db.execute('SELECT position, word FROM words WHERE position >= ? AND position < ? '
+                                    'ORDER BY position', (start, end)).fetchall()
+        return range_id, words
+
+    def renew(self, range_id, worker):
+        # Extends a lease; False means it expired and another worker has it.
+        with self.transaction():
+            return self.db.execute("UPDATE ranges SET lease_expires = ? WHERE id = ? AND worker = ? "
+                                   "AND status = 'leased'",
+                                   (time.time() + self.lease_seconds, range_id, worker)).rowcount > 0
+
+    def complete(self, range_id, worker, results, failures):
+        # `results` are (position, entry) pairs, `failures` (position, word,
+        # error). Results are kept even if the lease was lost meanwhile; the
+        # first entry stored for a word wins.
+        with self.transaction():
+            self.db.executemany('INSERT OR IGNORE INTO results (key, position, entry, worker) VALUES (?, ?, ?, ?)',
+                                [(entry['word'].lower(), position, json.dumps(entry, ensure_ascii=False), worker)
+                                 for position, entry in results])
+            self.db.executemany('INSERT OR REPLACE INTO failures (position, word, error, worker) VALUES (?, ?, ?, ?)',
+                                [(position, word, error, worker) for position, word, error in failures])
+            self.db.execute("UPDATE ranges SET status = 'done', worker = ?, lease_expires = NULL WHERE id = ?",
+                            (worker, range_id))
+
+    def release(self, range_id, worker):
+        # Hands an unfinished range back without waiting for the lease to expire
+        with self.transaction():
+            self.db.execute("UPDATE ranges SET status = 'pending', worker = NULL, lease_expires = NULL "
+                            "WHERE id = ? AND worker = ? AND status = 'leased'", (range_id, worker))
+
+    def unmerged(self):
+        # Results not yet marked merged, in word-list order
+        rows = self.db.execute('SELECT key, entry FROM results WHERE merged = 0 ORDER BY position').fetchall()
+        return [(key, json.loads(entry)) for key, entry in rows]
+
+    def mark_merged(self, keys):
+        with self.transaction():
+            self.db.executemany('UPDATE results SET merged = 1 WHERE key = ?', [(key,) for key in keys])
+
+    def counts(self):
+        counts = {'pending': 0, 'leased': 0, 'expired': 0, 'done': 0}
+        now = time.time()
+        for status, expires in self.db.execute('SELECT status, lease_expires FROM ranges'):
+            if status == 'leased' and expires < now:
+                status = 'expired'
+            counts[status] += 1
+        counts['results'] = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        counts['failures'] = self.db.execute('SELECT COUNT(*) FROM failures').fetchone()[0]
+        return counts
+
+    def finished(self):
+        return self.db.execute("SELECT COUNT(*) FROM ranges WHERE status != 'done'").fetchone()[0] == 0
+
+    def workers(self):
+        # Words stored per worker, to check that every node pulls its weight
+        return dict(self.db.execute('SELECT worker, COUNT(*) FROM results GROUP BY worker ORDER BY 2 DESC'))
+
+    def failures(self):
+        return self.db.execute('SELECT position, word, error FROM failures ORDER BY position').fetchall()
+
+
+class Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a genDB work queue.")
+    parser.add_argument('--queue', default=QUEUE_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='Ranges by state and words stored per worker')
+    subparsers.add_parser('failures', help='Words no worker could generate')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.command == 'status':
+        counts = queue.counts()
+        print(f"Source: {queue.get_meta('source')}")
+        print(f"Ranges: {counts['done']} done, {counts['leased']} leased, {counts['expired']} with expired "
+              f"leases, {counts['pending']} pending")
+        print(f"Results: {counts['results']} words, {counts['failures']} failures")
+        for worker, count in queue.workers().items():
+            print(f"  {worker}: {count}")
+    elif args.command == 'failures':
+        for position, word, error in queue.failures():
+            print(f"{position}\t{word}\t{error}")
+    queue.close()
+
+
+if __name__ == '__main__':
+    main()